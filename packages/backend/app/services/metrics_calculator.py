@@ -18,6 +18,9 @@ from app.models.metrics import CalculationResult, BatchCalculationResponse
 
 logger = logging.getLogger(__name__)
 
+# Helper modules in metrics_code/ that calculators import by bare name
+SHARED_CALCULATOR_MODULES = ("_mask_cache", "_type_a_core")
+
 
 class MetricsCalculator:
     """Metrics Calculator - executes indicator calculations"""
@@ -57,6 +60,23 @@ class MetricsCalculator:
             logger.error(f"Failed to load semantic colors: {e}")
             return False
 
+    def _register_shared_modules(self) -> None:
+        """Register metrics_code helper modules in sys.modules (idempotent)"""
+        for name in SHARED_CALCULATOR_MODULES:
+            if name in sys.modules:
+                continue
+            helper_path = self.metrics_code_dir / f"{name}.py"
+            if not helper_path.exists():
+                continue
+            spec = importlib.util.spec_from_file_location(name, helper_path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            try:
+                spec.loader.exec_module(module)
+            except Exception as e:
+                del sys.modules[name]
+                logger.error(f"Failed to load shared calculator module {name}: {e}")
+
     def load_calculator_module(self, indicator_id: str) -> Optional[Any]:
         """Load a calculator module by indicator ID"""
         try:
@@ -103,6 +123,12 @@ class MetricsCalculator:
                 # reloaded between calls.
                 sys.modules["input_layer"].semantic_colors = self.semantic_colors
 
+            # Shared helper modules living next to the calculators (e.g.
+            # `_mask_cache`, which decodes a mask once for all indicators)
+            # are imported by bare name. That resolves naturally when a
+            # calculator runs as a script from metrics_code/, but not here.
+            self._register_shared_modules()
+
             # Execute module — redirect stdout to avoid Windows GBK encoding
             # crashes from emoji characters in calculator print() statements
             old_stdout = sys.stdout
@@ -219,20 +245,22 @@ class MetricsCalculator:
                 return result
 
             from PIL import Image
+            # Registered in sys.modules by load_calculator_module()
+            from _mask_cache import pack_rgb
 
-            # Load semantic map as RGB numpy array
+            # Load semantic map as packed uint32 color keys (R | G<<8 | B<<16),
+            # so all target colors can be matched in one np.isin pass
             with Image.open(semantic_map_path) as sem_img:
-                sem_img = sem_img.convert("RGB")
-                sem_arr = np.array(sem_img)
+                sem_keys = pack_rgb(np.asarray(sem_img.convert("RGB")))
 
             # Load layer mask as grayscale
             with Image.open(mask_path) as mask_img:
                 mask_img = mask_img.convert("L")
                 mask_arr = np.array(mask_img) > 127  # boolean mask
 
-                if mask_arr.shape[:2] != sem_arr.shape[:2]:
+                if mask_arr.shape[:2] != sem_keys.shape:
                     # Resize mask to match semantic map
-                    mask_img = mask_img.resize((sem_arr.shape[1], sem_arr.shape[0]), Image.NEAREST)
+                    mask_img = mask_img.resize((sem_keys.shape[1], sem_keys.shape[0]), Image.NEAREST)
                     mask_arr = np.array(mask_img) > 127
 
             mask_pixels = int(np.sum(mask_arr))
@@ -283,18 +311,10 @@ class MetricsCalculator:
             else:
                 target_colors = []
 
-            target_mask = np.zeros(sem_arr.shape[:2], dtype=bool)
-            for rgb in target_colors:
-                match = (
-                    (sem_arr[:, :, 0] == rgb[0])
-                    & (sem_arr[:, :, 1] == rgb[1])
-                    & (sem_arr[:, :, 2] == rgb[2])
-                )
-                target_mask |= match
+            target_keys = pack_rgb(np.array(target_colors, dtype=np.uint8).reshape(-1, 3))
 
-            # Combine: target pixels that are within the layer mask
-            combined = target_mask & mask_arr
-            target_pixels = int(np.sum(combined))
+            # Count target pixels that are within the layer mask
+            target_pixels = int(np.count_nonzero(np.isin(sem_keys[mask_arr], target_keys)))
             value = (target_pixels / mask_pixels) * 100.0
 
             return CalculationResult(
@@ -0,0 +1,418 @@
+"""Shared Mask Cache.
+
+Helper module shared by calculator layers (not a calculator itself).
+
+Description:
+    The pipeline evaluates many indicators against the SAME semantic mask,
+    image by image. Each calculator used to decode the PNG and re-classify
+    every pixel on its own. This module decodes a mask once, packs every
+    RGB pixel into a single uint32 key (R | G<<8 | B<<16) and keeps the
+    resulting key histogram in a small LRU cache keyed by
+    (path, mtime, size), so the next calculator working on the same image
+    only consumes the histogram.
+
+    Calculators that need the raw raster (edges, textures, heuristics) can
+    share one decoded pixel array per mask the same way via
+    load_cached_pixels().
+
+Usage:
+    from _mask_cache import load_mask_keys
+    uniq_keys, key_counts, total_pixels = load_mask_keys(image_path)
+"""
+
+import copy
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+# Number of distinct masks whose key histograms are kept in memory
+KEY_CACHE_SIZE = 64
+
+# Masks are packed and histogrammed in horizontal strips of this many rows,
+# so only one strip's RGBX/key buffers exist at a time next to the decoded
+# raster (a 2048-wide strip is 8 MB of keys instead of 128 MB for 8192x4096)
+TILE_ROWS = 1024
+
+# Number of decoded (H, W, 3) pixel arrays kept in memory. Each one is a
+# full raster (6 MB for 2048x1024), so only the most recent few are kept;
+# calculators run image by image, so that is enough to share a decode.
+PIXEL_CACHE_SIZE = 4
+
+# Default longest side for ratio-only calculators that opt into sampling
+# (0 = always use the full mask). Set GREENSVC_MAX_SIDE=1024 to count a
+# nearest-neighbour downsample of large masks instead: class ratios stay
+# within a fraction of a percent, for a fraction of the packing work.
+MAX_SAMPLE_SIDE = int(os.environ.get('GREENSVC_MAX_SIDE') or 0)
+
+# Number of class names whose keyword match is remembered per matcher
+# (palettes have a few hundred names, reused for every image)
+CLASS_NAME_CACHE_SIZE = 1024
+
+
+# =============================================================================
+# DECODING
+# =============================================================================
+def load_mask_pixels(image_path: str) -> np.ndarray:
+    """
+    Decode a semantic mask into an (H, W, 3) uint8 array.
+
+    Skips the convert('RGB') round-trip when the file is already RGB and
+    reads the decoded raster straight into NumPy. For JPEG input, draft()
+    lets the decoder emit RGB directly.
+
+    Args:
+        image_path: Path to the semantic segmentation mask image
+
+    Returns:
+        np.ndarray: Read-only (H, W, 3) uint8 pixel array
+    """
+    with Image.open(image_path) as img:
+        img.draft('RGB', img.size)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.load()
+        pixels = np.frombuffer(img.tobytes(), dtype=np.uint8)
+        return pixels.reshape(img.height, img.width, 3)
+
+
+def load_mask_keys_array(image_path: str) -> np.ndarray:
+    """
+    Decode a semantic mask straight into packed uint32 color keys.
+
+    Pillow pads the raster to RGBX in C; the padded bytes are then
+    reinterpreted as little-endian uint32 (R | G<<8 | B<<16 | X<<24) and
+    the pad byte masked off. No per-channel shift/or passes are needed.
+
+    Args:
+        image_path: Path to the semantic segmentation mask image
+
+    Returns:
+        np.ndarray: (H, W) uint32 array of keys, same encoding as pack_rgb()
+    """
+    with Image.open(image_path) as img:
+        img.draft('RGB', img.size)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        padded = img.convert('RGBX')
+        keys = np.frombuffer(padded.tobytes(), dtype='<u4') & np.uint32(0xFFFFFF)
+        return keys.reshape(img.height, img.width)
+
+
+def pack_rgb(pixels: np.ndarray) -> np.ndarray:
+    """
+    Pack an (..., 3) uint8 RGB array into uint32 keys R | G<<8 | B<<16.
+
+    The channels are copied into a zero-padded 4-byte buffer that is viewed
+    as little-endian uint32 (SWAR packing), instead of three shifted
+    full-size temporaries.
+
+    Args:
+        pixels: Array whose last axis holds the R, G, B channels
+
+    Returns:
+        np.ndarray: uint32 array with the last axis removed
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    padded = np.zeros(pixels.shape[:-1] + (4,), dtype=np.uint8)
+    padded[..., :3] = pixels
+    return padded.view('<u4')[..., 0].astype(np.uint32, copy=False)
+
+
+def keyword_matcher(keywords: Iterable[str]) -> Callable[[str], bool]:
+    """
+    Build a predicate telling whether a class name contains any keyword.
+
+    The keywords are compiled into one case-insensitive alternation, and
+    class names are matched with '-' and '_' read as spaces. Results are
+    cached per class name, so a palette is classified once.
+
+    Args:
+        keywords: Substrings identifying a group of semantic classes
+
+    Returns:
+        callable: class_name -> True if any keyword occurs in it
+    """
+    pattern = re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE)
+    separators = str.maketrans("-_", "  ")
+
+    @lru_cache(maxsize=CLASS_NAME_CACHE_SIZE)
+    def matches(class_name: str) -> bool:
+        return pattern.search(class_name.translate(separators)) is not None
+
+    return matches
+
+
+# =============================================================================
+# CACHED KEY HISTOGRAM
+# =============================================================================
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def _load_keys(image_path: str, mtime_ns: int, size: int,
+               max_side: int = 0) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Decode, pack and histogram a mask strip by strip; cached per file version."""
+    # np.unique on a flat uint32 array is already a single compiled pass
+    # (~8 ms for a 2048x1024 mask, about a third of the PNG decode), so a
+    # hand-written hash-count kernel would not move the total noticeably.
+    # A 16M-entry color->class LUT gather followed by np.bincount was
+    # measured too: ~22 ms for the same mask (the random gather dominates),
+    # and it would tie the cached histogram to one palette.
+    with Image.open(image_path) as img:
+        if max_side and max(img.size) > max_side:
+            # NEAREST keeps exact class colors (no blended labels)
+            scale = max_side / max(img.size)
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                             Image.NEAREST)
+        if img.mode == 'P':
+            return _palette_keys(img)
+        img.draft('RGB', img.size)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        width, height = img.size
+        strip_keys, strip_counts = [], []
+        for top in range(0, height, TILE_ROWS):
+            strip = img if height <= TILE_ROWS else img.crop((0, top, width, min(height, top + TILE_ROWS)))
+            keys = np.frombuffer(strip.convert('RGBX').tobytes(), dtype='<u4') & np.uint32(0xFFFFFF)
+            uniq, counts = np.unique(keys, return_counts=True)
+            strip_keys.append(uniq)
+            strip_counts.append(counts.astype(np.int64, copy=False))
+
+    if len(strip_keys) == 1:
+        uniq_keys, key_counts = strip_keys[0], strip_counts[0]
+    else:
+        # Merge the per-strip histograms (a few dozen colors each)
+        uniq_keys, inverse = np.unique(np.concatenate(strip_keys), return_inverse=True)
+        key_counts = np.zeros(uniq_keys.size, dtype=np.int64)
+        np.add.at(key_counts, inverse, np.concatenate(strip_counts))
+    # Shared between calculators: make sure nobody mutates the cached arrays
+    uniq_keys.setflags(write=False)
+    key_counts.setflags(write=False)
+    return uniq_keys, key_counts, width * height
+
+
+def _palette_keys(img: Image.Image) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Histogram a paletted mask by index, without expanding it to RGB."""
+    # One byte per pixel: bincount the palette indices, then map the (at
+    # most 256) used entries to packed colors. Palettes may be short or
+    # repeat a color, so entries are padded with black (what convert('RGB')
+    # yields for them) and duplicate colors merged.
+    index_counts = np.bincount(np.asarray(img).reshape(-1), minlength=256)
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    entries = np.frombuffer(bytes(img.getpalette('RGB') or b''), dtype=np.uint8)[:768]
+    palette.reshape(-1)[:entries.size] = entries
+    used = np.flatnonzero(index_counts)
+    uniq_keys, inverse = np.unique(pack_rgb(palette[used]), return_inverse=True)
+    key_counts = np.zeros(uniq_keys.size, dtype=np.int64)
+    np.add.at(key_counts, inverse, index_counts[used])
+    uniq_keys.setflags(write=False)
+    key_counts.setflags(write=False)
+    return uniq_keys, key_counts, img.width * img.height
+
+
+def load_mask_keys(image_path: str, max_side: int = None) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Return the packed-color histogram of a semantic mask.
+
+    The result is cached by (path, mtime, size), so editing or replacing
+    the file invalidates the cached entry.
+
+    Args:
+        image_path: Path to the semantic segmentation mask image
+        max_side: If set, histogram a nearest-neighbour downsample whose
+            longest side is at most max_side pixels; counts and
+            total_pixels then refer to the downsampled mask.
+
+    Returns:
+        tuple: (uniq_keys, key_counts, total_pixels) where uniq_keys is a
+            sorted read-only uint32 array of packed colors present in the
+            image and key_counts the matching read-only int64 pixel counts.
+
+    Raises:
+        FileNotFoundError: If image_path does not exist
+    """
+    st = os.stat(image_path)
+    return _load_keys(os.path.abspath(image_path), st.st_mtime_ns, st.st_size, max_side or 0)
+
+
+def lookup_counts(uniq_keys: np.ndarray, key_counts: np.ndarray,
+                  keys: np.ndarray) -> np.ndarray:
+    """
+    Look up the pixel count of each packed color in a key histogram.
+
+    Args:
+        uniq_keys: Sorted packed colors from load_mask_keys()
+        key_counts: Pixel counts aligned with uniq_keys
+        keys: uint32 packed colors to look up
+
+    Returns:
+        np.ndarray: int64 counts aligned with keys (0 where absent)
+    """
+    keys = np.asarray(keys, dtype=np.uint32)
+    counts = np.zeros(keys.shape, dtype=np.int64)
+    if uniq_keys.size == 0 or keys.size == 0:
+        return counts
+    pos = np.minimum(np.searchsorted(uniq_keys, keys), uniq_keys.size - 1)
+    found = uniq_keys[pos] == keys
+    counts[found] = key_counts[pos[found]]
+    return counts
+
+
+def key_histogram(keys) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Histogram packed color keys that are already in memory.
+
+    Accepts a NumPy array or a torch-style tensor (anything exposing
+    .unique() and .cpu()), so an inference pipeline can pack its mask on
+    the device as r | g<<8 | b<<16 (int32/int64) and transfer only the few
+    (key, count) pairs. Nothing here imports torch.
+
+    Args:
+        keys: Array or tensor of packed colors, any shape
+
+    Returns:
+        tuple: (uniq_keys, key_counts, total_pixels) in the same format as
+            load_mask_keys()
+    """
+    if hasattr(keys, 'cpu'):
+        uniq, counts = keys.reshape(-1).unique(return_counts=True)
+        uniq_keys = np.asarray(uniq.cpu().numpy(), dtype=np.uint32)
+        key_counts = np.asarray(counts.cpu().numpy(), dtype=np.int64)
+        return uniq_keys, key_counts, int(keys.numel())
+    keys = np.asarray(keys)
+    uniq_keys, key_counts = np.unique(keys.astype(np.uint32, copy=False), return_counts=True)
+    return uniq_keys, key_counts.astype(np.int64, copy=False), int(keys.size)
+
+
+# =============================================================================
+# CACHED PIXELS
+# =============================================================================
+@lru_cache(maxsize=PIXEL_CACHE_SIZE)
+def _load_pixels(image_path: str, mtime_ns: int, size: int) -> np.ndarray:
+    """Decode a mask to RGB pixels; cached per file version."""
+    return load_mask_pixels(image_path)
+
+
+def load_cached_pixels(image_path: str) -> np.ndarray:
+    """
+    Return the decoded RGB pixels of a semantic mask, shared across calls.
+
+    The result is cached by (path, mtime, size) like load_mask_keys(), so
+    calculators working on the same image decode it only once.
+
+    Args:
+        image_path: Path to the semantic segmentation mask image
+        
+    Returns:
+        np.ndarray: Read-only (H, W, 3) uint8 pixel array; copy it before
+            writing into it
+
+    Raises:
+        FileNotFoundError: If image_path does not exist
+    """
+    st = os.stat(image_path)
+    return _load_pixels(os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+
+
+# =============================================================================
+# CACHED RESULTS
+# =============================================================================
+# lru_caches created by cache_by_file(), emptied by clear_cache()
+_RESULT_CACHES = []
+
+
+def cache_by_file(maxsize: int) -> Callable:
+    """
+    Decorator caching a calculator's result per file version.
+
+    The decorated function is called as fn(image_path, *args). Its result
+    is cached under (abspath, mtime_ns, size, *args), so an edited file is
+    recomputed, and each call hands out a deep copy so callers cannot
+    modify the cached dict. A missing or unreadable file returns the usual
+    error result without taking a cache slot.
+
+    Args:
+        maxsize: Number of (file version, args) results to keep
+
+    Returns:
+        callable: Decorator for functions returning a result dict
+    """
+    def decorate(fn: Callable[..., Dict]) -> Callable[..., Dict]:
+        @lru_cache(maxsize=maxsize)
+        def cached(image_path: str, mtime_ns: int, size: int, *args) -> Dict:
+            return fn(image_path, *args)
+
+        @wraps(fn)
+        def wrapper(image_path: str, *args) -> Dict:
+            try:
+                st = os.stat(image_path)
+            except FileNotFoundError:
+                return {
+                    'success': False,
+                    'error': f'Image file not found: {image_path}',
+                    'value': None
+                }
+            except Exception as e:
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'value': None
+                }
+            result = cached(os.path.abspath(image_path), st.st_mtime_ns, st.st_size, *args)
+            return copy.deepcopy(result)
+
+        wrapper.cache_info = cached.cache_info
+        wrapper.cache_clear = cached.cache_clear
+        _RESULT_CACHES.append(cached)
+        return wrapper
+
+    return decorate
+
+
+def clear_cache() -> None:
+    """Drop all cached key histograms, pixel arrays and results."""
+    _load_keys.cache_clear()
+    _load_pixels.cache_clear()
+    for cached in _RESULT_CACHES:
+        cached.cache_clear()
+
+
+# =============================================================================
+# BATCHING
+# =============================================================================
+def worker_count(n_workers: int, n_items: int) -> int:
+    """
+    Clamp a requested thread count to [1, n_items].
+
+    Args:
+        n_workers: Requested number of threads (None or 0: os.cpu_count())
+        n_items: Number of work items
+
+    Returns:
+        int: Number of threads to start
+    """
+    return max(1, min(n_workers or os.cpu_count() or 1, n_items or 1))
+
+
+def map_images(fn: Callable[[str], Dict], image_paths: Sequence[str],
+               n_workers: int = None) -> List[Dict]:
+    """
+    Apply a per-image function to many paths on a thread pool.
+
+    Pillow's decoders and the NumPy kernels used by the calculators release
+    the GIL, so threads keep several images in flight without pickling the
+    loader-injected module state.
+
+    Args:
+        fn: Function called with each path, e.g. a calculate_indicator()
+        image_paths: Paths to the images
+        n_workers: Number of worker threads (default: os.cpu_count())
+
+    Returns:
+        list: fn(path) for each path, in order
+    """
+    with ThreadPoolExecutor(max_workers=worker_count(n_workers, len(image_paths))) as pool:
+        return list(pool.map(fn, image_paths))
@@ -0,0 +1,152 @@
+"""Shared TYPE A Core.
+
+Helper module shared by calculator layers (not a calculator itself).
+
+Description:
+    TYPE A (ratio mode) calculators all compute
+    (Sum(Target_Pixels) / Sum(Total_Pixels)) × 100 over a fixed set of
+    semantic classes and only differ in which classes they target. This
+    module holds that calculation once. A calculator packs its target
+    colors into uint32 keys at import time with build_target_keys(), and
+    compute_type_a() counts them on the cached key histogram from
+    _mask_cache, so all TYPE A indicators on the same mask share a single
+    decode.
+
+Usage:
+    from _type_a_core import build_target_keys, compute_type_a
+    TARGET_NAMES, TARGET_KEYS = build_target_keys(TARGET_RGB)
+    result = compute_type_a(image_path, TARGET_NAMES, TARGET_KEYS)
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from _mask_cache import key_histogram, load_mask_keys, lookup_counts, pack_rgb
+
+
+# =============================================================================
+# TARGET KEYS
+# =============================================================================
+def build_target_keys(target_rgb: Dict[Tuple[int, int, int], str]) -> Tuple[List[str], np.ndarray]:
+    """
+    Pack a calculator's TARGET_RGB table into lookup keys.
+
+    Args:
+        target_rgb: Mapping of RGB tuple -> class name
+
+    Returns:
+        tuple: (target_names, target_keys) where target_keys is a uint32
+            array of packed colors aligned with the target_names list
+    """
+    target_names = list(target_rgb.values())
+    target_keys = pack_rgb(np.array(list(target_rgb), dtype=np.uint8).reshape(-1, 3))
+    return target_names, target_keys
+
+
+# =============================================================================
+# RATIO CALCULATION
+# =============================================================================
+def ratio_from_histogram(uniq_keys: np.ndarray, key_counts: np.ndarray, total_pixels: int,
+                         target_names: List[str], target_keys: np.ndarray,
+                         detail: bool = True) -> Dict:
+    """
+    Calculate a TYPE A ratio from a packed-color histogram.
+
+    Args:
+        uniq_keys: Sorted packed colors, as from load_mask_keys()
+        key_counts: Pixel counts aligned with uniq_keys
+        total_pixels: Total pixel count of the mask
+        target_names: Class names aligned with target_keys
+        target_keys: Packed colors of the target classes
+        detail: If False, skip the per-class 'class_breakdown' dict.
+
+    Returns:
+        dict: Result dictionary with 'success', 'value' (percentage),
+            'target_pixels', 'total_pixels' and, with detail,
+            'class_breakdown' (pixel count of each target class present)
+    """
+    # One lookup of all target colors instead of a full-image comparison
+    # per class
+    target_counts = lookup_counts(uniq_keys, key_counts, target_keys)
+    target_count = int(target_counts.sum())
+    value = (target_count / total_pixels) * 100 if total_pixels > 0 else 0
+
+    result = {
+        'success': True,
+        'value': round(value, 3),
+        'target_pixels': target_count,
+        'total_pixels': int(total_pixels)
+    }
+    if detail:
+        result['class_breakdown'] = {
+            class_name: count
+            for class_name, count in zip(target_names, target_counts.tolist())
+            if count > 0
+        }
+    return result
+
+
+def ratio_from_pixels(pixels: np.ndarray, target_names: List[str], target_keys: np.ndarray,
+                      detail: bool = True) -> Dict:
+    """
+    Calculate a TYPE A ratio from an in-memory (H, W, 3) RGB mask.
+
+    Skips the file round-trip, e.g. for masks produced in memory by a
+    segmentation step or for self-tests on synthetic arrays.
+
+    Args:
+        pixels: (H, W, 3) uint8 RGB array
+        target_names: Class names aligned with target_keys
+        target_keys: Packed colors of the target classes
+        detail: If False, skip the per-class 'class_breakdown' dict.
+
+    Returns:
+        dict: Result dictionary as from ratio_from_histogram()
+    """
+    return ratio_from_histogram(*key_histogram(pack_rgb(pixels)), target_names, target_keys, detail)
+
+
+def compute_type_a(image_path: str, target_names: List[str], target_keys: np.ndarray,
+                   detail: bool = True) -> Dict:
+    """
+    Calculate a TYPE A ratio for a semantic segmentation mask image.
+
+    The mask is decoded and histogrammed once per file version by
+    _mask_cache, so other calculators on the same mask reuse the work.
+    If no target class is in the palette, the mask is not decoded at all.
+
+    Args:
+        image_path: Path to the semantic segmentation mask image (PNG/JPG)
+        target_names: Class names aligned with target_keys
+        target_keys: Packed colors of the target classes
+        detail: If False, skip the per-class 'class_breakdown' dict.
+
+    Returns:
+        dict: Result dictionary as from ratio_from_histogram(), or
+            {'success': False, 'error', 'value': None} on failure
+    """
+    try:
+        if target_keys.size == 0:
+            # None of the target classes is in the palette: the ratio is 0
+            # whatever the mask holds, so only read the size from the header
+            with Image.open(image_path) as img:
+                width, height = img.size
+            return ratio_from_histogram(np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64),
+                                        width * height, target_names, target_keys, detail)
+        uniq_keys, key_counts, total_pixels = load_mask_keys(image_path)
+        return ratio_from_histogram(uniq_keys, key_counts, total_pixels,
+                                    target_names, target_keys, detail)
+    except FileNotFoundError:
+        return {
+            'success': False,
+            'error': f'Image file not found: {image_path}',
+            'value': None
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'value': None
+        }
@@ -18,10 +18,13 @@ Description:
 Formula: )
 """
 
+import math
 import numpy as np
 from PIL import Image
 from typing import Dict, List, Tuple
 
+from _mask_cache import load_mask_keys, lookup_counts, pack_rgb
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -63,10 +66,24 @@ print(f" Formula: {INDICATOR['formula']}")
 print(f" Unit: {INDICATOR['unit']}")
 
 
+# =============================================================================
+# SEMANTIC PALETTE ARRAYS
+# =============================================================================
+# semantic_colors is fixed for the lifetime of the module, so lay it out once
+# as aligned arrays: CLASS_NAMES[i] <-> COLORS_ARR[i] <-> COLOR_KEYS[i].
+# COLOR_KEYS packs each RGB triple into a single uint32 key (see pack_rgb).
+CLASS_NAMES = list(semantic_colors)
+COLORS_ARR = np.array(list(semantic_colors.values()), dtype=np.uint8).reshape(-1, 3)
+COLOR_KEYS = pack_rgb(COLORS_ARR)
+
+# ln(2), used to convert entropy from nats to bits
+LN2 = math.log(2)
+
+
 # =============================================================================
 # CALCULATION FUNCTION
 # =============================================================================
-def calculate_indicator(image_path: str) -> Dict:
+def calculate_indicator(image_path: str, detail: bool = True) -> Dict:
     """
     Calculate the Diversity Index (DIV) using Hill number (q=1).
     
@@ -81,6 +98,9 @@ def calculate_indicator(image_path: str) -> Dict:
     
     Args:
         image_path: Path to the semantic segmentation mask image
+        detail: If False, skip the per-class dicts ('class_distribution',
+            'class_probabilities', 'top_classes') and return scalars only.
+            Useful for bulk scans that only persist the indicator value.
         
     Returns:
         dict: Result dictionary containing:
@@ -100,25 +120,18 @@ def calculate_indicator(image_path: str) -> Dict:
         ...     print(f"Classes detected: {result['n_classes']}")
     """
     try:
-        # Step 1: Load and prepare the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        flat_pixels = pixels.reshape(-1, 3)
+        # Step 1: Load the packed-color histogram of the mask
+        # (decoded once per file and shared with other calculators)
+        uniq_keys, key_counts, total_pixels = load_mask_keys(image_path)
         
         # Step 2: Count pixels for each semantic class
-        class_counts = {}
-        
-        for class_name, rgb in semantic_colors.items():
-            # Create boolean mask for this class
-            mask = np.all(flat_pixels == rgb, axis=1)
-            count = np.sum(mask)
-            if count > 0:
-                class_counts[class_name] = int(count)
+        # Look all palette colors up in the histogram in one vectorized step
+        palette_counts = lookup_counts(uniq_keys, key_counts, COLOR_KEYS)
+        present = np.flatnonzero(palette_counts)
+        counts_arr = palette_counts[present]
         
         # Step 3: Calculate probability distribution
-        total_counted = sum(class_counts.values())
+        total_counted = int(counts_arr.sum())
         
         # Handle edge case: no semantic classes detected
         if total_counted == 0:
@@ -138,23 +151,19 @@ def calculate_indicator(image_path: str) -> Dict:
             }
         
         # Calculate probability for each class
-        probabilities = {}
-        for class_name, count in class_counts.items():
-            probabilities[class_name] = count / total_counted
+        n_classes = int(present.size)
+        probs = counts_arr / total_counted
         
         # Step 4: Calculate Shannon Entropy (natural log)
-        # H = -Σ(pᵢ × ln(pᵢ))
-        shannon_entropy = 0.0
-        for p in probabilities.values():
-            if p > 0:  # Avoid log(0)
-                shannon_entropy -= p * np.log(p)  # Natural log
+        # H = -Σ(pᵢ × ln(pᵢ)); log(0) terms are masked out and contribute 0
+        log_probs = np.zeros_like(probs)
+        np.log(probs, where=probs > 0, out=log_probs)
+        shannon_entropy = float(-np.dot(probs, log_probs))
         
         # Step 5: Calculate Hill number (^1D = exp(H))
-        hill_number = np.exp(shannon_entropy)
+        hill_number = math.exp(shannon_entropy)
         
         # Step 6: Calculate additional metrics
-        n_classes = len(class_counts)
-        
         # Maximum possible diversity (uniform distribution = n_classes)
         max_diversity = float(n_classes)
         
@@ -164,21 +173,16 @@ def calculate_indicator(image_path: str) -> Dict:
         # Unmatched pixels (e.g., black background)
         unmatched_pixels = total_pixels - total_counted
         
-        # Top 5 classes by pixel count
-        top_classes = dict(sorted(class_counts.items(), 
-                                  key=lambda x: x[1], 
-                                  reverse=True)[:5])
-        
         # Calculate evenness (how evenly distributed are the classes)
         # Evenness = H / ln(n) = (ln(^1D)) / ln(n)
-        evenness = shannon_entropy / np.log(n_classes) if n_classes > 1 else 1.0
+        evenness = shannon_entropy / math.log(n_classes) if n_classes > 1 else 1.0
         
         # Step 7: Return results
-        return {
+        result = {
             'success': True,
             'value': round(hill_number, 3),
             'shannon_entropy': round(shannon_entropy, 3),
-            'shannon_entropy_bits': round(shannon_entropy / np.log(2), 3),  # Convert to bits
+            'shannon_entropy_bits': round(shannon_entropy / LN2, 3),  # Convert to bits
             'n_classes': n_classes,
             'max_possible_diversity': round(max_diversity, 3),
             'normalized_diversity': round(normalized_diversity, 3),
@@ -186,11 +190,30 @@ def calculate_indicator(image_path: str) -> Dict:
             'total_pixels': int(total_pixels),
             'matched_pixels': int(total_counted),
             'unmatched_pixels': int(unmatched_pixels),
-            'match_ratio': round(total_counted / total_pixels * 100, 2),
-            'class_distribution': class_counts,
-            'class_probabilities': {k: round(v, 4) for k, v in probabilities.items()},
-            'top_classes': top_classes
+            'match_ratio': round(total_counted / total_pixels * 100, 2)
         }
+        if not detail:
+            return result
+        
+        # Per-class breakdown
+        class_names = [CLASS_NAMES[i] for i in present]
+        class_counts = dict(zip(class_names, counts_arr.tolist()))
+        
+        # Top 5 classes by pixel count (partial selection, no full sort).
+        # Every class tied with the 5th count is kept as a candidate, and the
+        # stable sort then breaks ties in palette order, as sorted() did
+        if n_classes > 5:
+            fifth = np.partition(counts_arr, -5)[-5]
+            top_idx = np.flatnonzero(counts_arr >= fifth)
+        else:
+            top_idx = np.arange(n_classes)
+        top_idx = top_idx[np.argsort(-counts_arr[top_idx], kind='stable')][:5]
+        top_classes = {class_names[i]: int(counts_arr[i]) for i in top_idx}
+        
+        result['class_distribution'] = class_counts
+        result['class_probabilities'] = dict(zip(class_names, np.round(probs, 4).tolist()))
+        result['top_classes'] = top_classes
+        return result
         
     except FileNotFoundError:
         return {
@@ -13,10 +13,15 @@ Description:
 Formula: ENC_BLD = 1 - SVF_buildings
 """
 
+from functools import lru_cache
+from operator import itemgetter
+
 import numpy as np
 from PIL import Image
 from typing import Dict, List, Tuple
 
+from _mask_cache import keyword_matcher, load_mask_keys, lookup_counts, pack_rgb
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -85,6 +90,10 @@ BUILDING_KEYWORDS = [
     "architecture", "structure"
 ]
 
+# Keyword predicates: one case-insensitive regex per group, cached per name
+SKY_MATCHER = keyword_matcher(SKY_KEYWORDS)
+BUILDING_MATCHER = keyword_matcher(BUILDING_KEYWORDS)
+
 
 def is_sky_class(class_name: str) -> bool:
     """
@@ -96,8 +105,7 @@ def is_sky_class(class_name: str) -> bool:
     Returns:
         bool: True if class is sky related
     """
-    class_lower = class_name.lower().replace("-", " ").replace("_", " ")
-    return any(kw in class_lower for kw in SKY_KEYWORDS)
+    return SKY_MATCHER(class_name)
 
 
 def is_building_class(class_name: str) -> bool:
@@ -110,8 +118,46 @@ def is_building_class(class_name: str) -> bool:
     Returns:
         bool: True if class is building related
     """
-    class_lower = class_name.lower().replace("-", " ").replace("_", " ")
-    return any(kw in class_lower for kw in BUILDING_KEYWORDS)
+    return BUILDING_MATCHER(class_name)
+
+
+@lru_cache(maxsize=16)
+def classify_palette(colors: Tuple[Tuple[str, Tuple[int, int, int]], ...]) -> Dict:
+    """
+    Split a semantic palette into sky and building classes (cached per palette).
+    
+    Args:
+        colors: (class_name, rgb) pairs of the palette
+        
+    Returns:
+        dict: 'sky_names' / 'building_names' (lists of class names),
+            'sky_keys' / 'building_keys' (packed uint32 colors aligned with
+            the names) and 'sky_unique' / 'building_unique' (deduplicated keys)
+    """
+    sky_names, sky_rgbs = [], []
+    building_names, building_rgbs = [], []
+    for class_name, rgb in colors:
+        if is_sky_class(class_name):
+            sky_names.append(class_name)
+            sky_rgbs.append(rgb)
+        elif is_building_class(class_name):
+            building_names.append(class_name)
+            building_rgbs.append(rgb)
+    
+    sky_keys = pack_rgb(np.array(sky_rgbs, dtype=np.uint8).reshape(-1, 3))
+    building_keys = pack_rgb(np.array(building_rgbs, dtype=np.uint8).reshape(-1, 3))
+    split = {
+        'sky_names': sky_names,
+        'sky_keys': sky_keys,
+        'sky_unique': np.unique(sky_keys),
+        'building_names': building_names,
+        'building_keys': building_keys,
+        'building_unique': np.unique(building_keys),
+    }
+    # Shared between calls: make sure nobody mutates the cached arrays
+    for key in ('sky_keys', 'sky_unique', 'building_keys', 'building_unique'):
+        split[key].setflags(write=False)
+    return split
 
 
 # =============================================================================
@@ -155,36 +201,35 @@ def calculate_indicator(image_path: str,
         ...     print(f"SVF_buildings: {result['svf_buildings']:.4f}")
     """
     try:
-        # Step 1: Load and prepare the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        
-        # Step 2: Create masks for sky and buildings
-        sky_mask = np.zeros((h, w), dtype=np.uint8)
-        building_mask = np.zeros((h, w), dtype=np.uint8)
+        # Step 1: Load the packed-color histogram of the mask
+        # (decoded once per file and shared with other calculators)
+        uniq_keys, key_counts, total_pixels = load_mask_keys(image_path)
         
+        # Step 2: Count sky and building pixels per class
         sky_classes_found = {}
         building_classes_found = {}
+        sky_pixels = 0
+        building_pixels = 0
         
         if semantic_colors:
             # Use provided semantic color configuration
-            for class_name, rgb in semantic_colors.items():
-                mask = np.all(pixels == rgb, axis=2)
-                count = int(np.sum(mask))
-                
+            split = classify_palette(
+                tuple((class_name, tuple(rgb)) for class_name, rgb in semantic_colors.items()))
+            
+            sky_counts = lookup_counts(uniq_keys, key_counts, split['sky_keys'])
+            for class_name, count in zip(split['sky_names'], sky_counts.tolist()):
                 if count > 0:
-                    if is_sky_class(class_name):
-                        sky_mask[mask] = 1
-                        sky_classes_found[class_name] = count
-                    elif is_building_class(class_name):
-                        building_mask[mask] = 1
-                        building_classes_found[class_name] = count
-        
-        # Step 3: Calculate pixel counts
-        sky_pixels = int(np.sum(sky_mask > 0))
-        building_pixels = int(np.sum(building_mask > 0))
+                    sky_classes_found[class_name] = count
+            
+            building_counts = lookup_counts(uniq_keys, key_counts, split['building_keys'])
+            for class_name, count in zip(split['building_names'], building_counts.tolist()):
+                if count > 0:
+                    building_classes_found[class_name] = count
+            
+            # Step 3: Calculate pixel counts
+            # Classes sharing a color are counted once, as with a per-pixel mask
+            sky_pixels = int(lookup_counts(uniq_keys, key_counts, split['sky_unique']).sum())
+            building_pixels = int(lookup_counts(uniq_keys, key_counts, split['building_unique']).sum())
         
         # Step 4: Calculate ENC_BLD
         # ENC_BLD = 1 - SVF_buildings
@@ -209,8 +254,8 @@ def calculate_indicator(image_path: str,
         n_building_classes = len(building_classes_found)
         
         # Sort classes by pixel count
-        sorted_sky = dict(sorted(sky_classes_found.items(), key=lambda x: x[1], reverse=True))
-        sorted_building = dict(sorted(building_classes_found.items(), key=lambda x: x[1], reverse=True))
+        sorted_sky = dict(sorted(sky_classes_found.items(), key=itemgetter(1), reverse=True))
+        sorted_building = dict(sorted(building_classes_found.items(), key=itemgetter(1), reverse=True))
         
         # Find dominant building class
         dominant_building = max(building_classes_found, key=building_classes_found.get) if building_classes_found else None
@@ -18,9 +18,17 @@ Description:
 Formula: FNC = (Sum(Fence_Pixels) / Sum(Total_Pixels)) × 100
 """
 
+import logging
+import os
+
 import numpy as np
 from PIL import Image
-from typing import Dict
+from typing import Dict, List
+
+from _mask_cache import map_images
+from _type_a_core import build_target_keys, compute_type_a
+
+logger = logging.getLogger(__name__)
 
 
 # =============================================================================
@@ -62,29 +70,47 @@ INDICATOR = {
 # This section creates a mapping from RGB values to class names
 # The semantic_colors dictionary comes from input_layer.py
 
+if 'semantic_colors' not in globals():
+    # Not injected by the loader (e.g. a bare import): nothing to match
+    semantic_colors = {}
+
 TARGET_RGB = {}
 
-print(f"\nBuilding color lookup for {INDICATOR['id']}:")
+# First ';'-separated token of each class name -> first full class name
+# using it; built only if a target class is missing from the palette
+PREFIX_TO_NAME = None
+
+logger.debug("Building color lookup for %s", INDICATOR['id'])
 for class_name in INDICATOR.get('target_classes', []):
     if class_name in semantic_colors:
         rgb = semantic_colors[class_name]
         TARGET_RGB[rgb] = class_name
-        print(f" {class_name}: RGB{rgb}")
+        logger.debug("%s: RGB%s", class_name, rgb)
     else:
-        print(f" ️ NOT FOUND: {class_name}")
-        # Try partial matching to suggest corrections
-        for name in semantic_colors.keys():
-            if class_name.split(';')[0] in name or name.split(';')[0] in class_name:
-                print(f" Did you mean: '{name}'?")
-                break
+        logger.warning("%s: target class not found: %s", INDICATOR['id'], class_name)
+        # Try prefix matching to suggest corrections, then partial matching
+        if PREFIX_TO_NAME is None:
+            PREFIX_TO_NAME = {}
+            for name in semantic_colors.keys():
+                PREFIX_TO_NAME.setdefault(name.split(';')[0], name)
+        prefix = class_name.split(';')[0]
+        suggestion = PREFIX_TO_NAME.get(prefix)
+        if suggestion is None:
+            suggestion = next((name for name in semantic_colors.keys()
+                               if prefix in name or name.split(';')[0] in class_name), None)
+        if suggestion is not None:
+            logger.warning("%s: did you mean '%s'?", INDICATOR['id'], suggestion)
+
+# Packed uint32 keys of the target colors, aligned with TARGET_NAMES
+TARGET_NAMES, TARGET_KEYS = build_target_keys(TARGET_RGB)
 
-print(f"\nCalculator ready: {INDICATOR['id']} ({len(TARGET_RGB)} classes matched)")
+logger.debug("Calculator ready: %s (%d classes matched)", INDICATOR['id'], len(TARGET_RGB))
 
 
 # =============================================================================
 # CALCULATION FUNCTION
 # =============================================================================
-def calculate_indicator(image_path: str) -> Dict:
+def calculate_indicator(image_path: str, detail: bool = True) -> Dict:
     """
     Calculate the Fence Ratio (FNC) for a semantic segmentation mask image.
     
@@ -96,6 +122,7 @@ def calculate_indicator(image_path: str) -> Dict:
     
     Args:
         image_path: Path to the semantic segmentation mask image (PNG/JPG)
+        detail: If False, skip the per-class 'class_breakdown' dict.
         
     Returns:
         dict: Result dictionary containing:
@@ -112,54 +139,27 @@ def calculate_indicator(image_path: str) -> Dict:
         ...     print(f"FNC: {result['value']:.2f}%")
         ...     print(f"Fence pixels: {result['target_pixels']}")
     """
-    try:
-        # Step 1: Load the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        
-        # Flatten pixel array for efficient comparison
-        flat_pixels = pixels.reshape(-1, 3)
-        
-        # Step 2: Count pixels for each target class (fences and railings)
-        target_count = 0
-        class_counts = {}
-        
-        for rgb, class_name in TARGET_RGB.items():
-            # Find pixels that exactly match this RGB value
-            mask = np.all(flat_pixels == rgb, axis=1)
-            count = np.sum(mask)
-            
-            if count > 0:
-                class_counts[class_name] = int(count)
-                target_count += count
-        
-        # Step 3: Calculate the indicator value (ratio mode)
-        # FNC = (fence_pixels / total_pixels) × 100
-        value = (target_count / total_pixels) * 100 if total_pixels > 0 else 0
-        
-        # Step 4: Return results
-        return {
-            'success': True,
-            'value': round(value, 3),
-            'target_pixels': int(target_count),
-            'total_pixels': int(total_pixels),
-            'class_breakdown': class_counts
-        }
+    # Shared TYPE A calculation on the cached mask histogram
+    return compute_type_a(image_path, TARGET_NAMES, TARGET_KEYS, detail)
+
+
+# =============================================================================
+# BATCH CALCULATION
+# =============================================================================
+def calculate_indicator_batch(image_paths: List[str], n_workers: int = None,
+                              detail: bool = True) -> List[Dict]:
+    """
+    Calculate FNC for many masks on a thread pool (see _mask_cache.map_images()).
+    
+    Args:
+        image_paths: Paths to semantic segmentation mask images
+        n_workers: Number of worker threads (default: os.cpu_count())
+        detail: Passed through to calculate_indicator()
         
-    except FileNotFoundError:
-        return {
-            'success': False,
-            'error': f'Image file not found: {image_path}',
-            'value': None
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e),
-            'value': None
-        }
+    Returns:
+        list: One calculate_indicator() result dict per path, in order
+    """
+    return map_images(lambda path: calculate_indicator(path, detail), image_paths, n_workers)
 
 
 # =============================================================================
@@ -15,10 +15,15 @@ Description:
 Formula: )
 """
 
+import os
+from operator import itemgetter
+
 import numpy as np
 from PIL import Image
 from typing import Dict, List, Tuple
 
+from _mask_cache import load_mask_keys, lookup_counts, map_images, pack_rgb
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -131,20 +136,14 @@ def calculate_gini_pairwise(proportions: np.ndarray) -> float:
     n = len(props)
     
     # Calculate sum of absolute differences
-    total_diff = 0.0
-    for i in range(n):
-        for j in range(n):
-            total_diff += abs(props[i] - props[j])
-    
-    # Gini = sum|p_i - p_j| / (2 * n)
-    # But we need to account for mean, so:
-    # G = sum|p_i - p_j| / (2 * n * mean) = sum|p_i - p_j| * n / (2 * n) = sum|p_i - p_j| / 2
-    # For normalized props where mean = 1/n:
-    gini = total_diff / (2 * n * (1/n))  # = total_diff * n / 2
-    
-    # Actually the correct formula for normalized data is:
-    # G = sum|p_i - p_j| / (2 * n^2 * mean) where mean = 1/n
-    # G = sum|p_i - p_j| * n / (2 * n^2) = sum|p_i - p_j| / (2 * n)
+    # For sorted values, sum_i sum_j |p_i - p_j| = 2 * sum_i (2i - n - 1) * p_i
+    # (i = 1..n), so the O(n^2) double loop becomes one sort and a dot product
+    props_sorted = np.sort(props)
+    indices = np.arange(1, n + 1)
+    total_diff = 2.0 * np.dot(2 * indices - n - 1, props_sorted)
+    
+    # For normalized data (mean = 1/n):
+    # G = sum|p_i - p_j| / (2 * n^2 * mean) = sum|p_i - p_j| / (2 * n)
     gini = total_diff / (2 * n)
     
     return max(0.0, min(1.0, gini))
@@ -154,7 +153,8 @@ def calculate_gini_pairwise(proportions: np.ndarray) -> float:
 # CALCULATION FUNCTION
 # =============================================================================
 def calculate_indicator(image_path: str, 
-                        semantic_colors: Dict[str, Tuple[int, int, int]] = None) -> Dict:
+                        semantic_colors: Dict[str, Tuple[int, int, int]] = None,
+                        detail: bool = True) -> Dict:
     """
     Calculate the Gini Index (GIN) indicator for pixel distribution inequality.
     
@@ -169,6 +169,9 @@ def calculate_indicator(image_path: str,
         image_path: Path to the semantic segmentation mask image
         semantic_colors: Dictionary mapping class names to RGB tuples.
                         If not provided, auto-detects unique colors.
+        detail: If False, skip the class ranking ('lorenz_area',
+            'class_distribution', 'top_classes') and return only the
+            scalar statistics.
         
     Returns:
         dict: Result dictionary containing:
@@ -177,7 +180,7 @@ def calculate_indicator(image_path: str,
             - 'n_classes' (int): Number of classes detected
             - 'dominant_class' (str): Class with most pixels
             - 'dominance_ratio' (float): Proportion of dominant class
-            - 'class_distribution' (dict): Pixel counts by class
+            - 'class_distribution' (dict): Pixel counts by class, with detail
             - 'error' (str): Error message if success is False
             
     Example:
@@ -186,29 +189,35 @@ def calculate_indicator(image_path: str,
         ...     print(f"Gini Index: {result['value']:.3f}")
     """
     try:
-        # Step 1: Load and prepare the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
+        # Step 1: Load the packed-color histogram of the mask
+        # (decoded once per file and shared with other calculators)
+        uniq_keys, key_counts, total_pixels = load_mask_keys(image_path)
         
         # Step 2: Count pixels by class
         class_counts = {}
         
         if semantic_colors:
             # Use provided semantic color configuration
-            for class_name, rgb in semantic_colors.items():
-                mask = np.all(pixels == rgb, axis=2)
-                count = int(np.sum(mask))
+            # One lookup of every class color in the histogram instead of a
+            # full-image comparison per class
+            class_names = list(semantic_colors)
+            class_keys = pack_rgb(np.array([semantic_colors[name] for name in class_names],
+                                           dtype=np.uint8).reshape(-1, 3))
+            counts = lookup_counts(uniq_keys, key_counts, class_keys).tolist()
+            for class_name, count in zip(class_names, counts):
                 if count > 0:
                     class_counts[class_name] = count
         else:
             # Auto-detect unique colors
-            pixels_reshaped = pixels.reshape(-1, 3)
-            unique_colors, counts = np.unique(pixels_reshaped, axis=0, return_counts=True)
-            for i, (color, count) in enumerate(zip(unique_colors, counts)):
-                class_name = f"class_{i+1}_rgb({color[0]},{color[1]},{color[2]})"
-                class_counts[class_name] = int(count)
+            reds = (uniq_keys & 0xFF).tolist()
+            greens = ((uniq_keys >> 8) & 0xFF).tolist()
+            blues = (uniq_keys >> 16).tolist()
+            # Number classes in (R, G, B) order, as a row-wise unique would
+            order = sorted(range(len(reds)), key=lambda k: (reds[k], greens[k], blues[k]))
+            counts = key_counts.tolist()
+            for i, k in enumerate(order):
+                class_name = f"class_{i+1}_rgb({reds[k]},{greens[k]},{blues[k]})"
+                class_counts[class_name] = counts[k]
         
         # Step 3: Calculate proportions
         if not class_counts:
@@ -227,22 +236,16 @@ def calculate_indicator(image_path: str,
         gini = calculate_gini_coefficient(proportions)
         
         # Step 5: Calculate additional metrics
-        # Find dominant class
-        sorted_classes = sorted(class_counts.items(), key=lambda x: x[1], reverse=True)
-        dominant_class = sorted_classes[0][0]
-        dominance_ratio = sorted_classes[0][1] / total_pixels
-        
-        # Calculate Lorenz curve points for reference
-        props_sorted = np.sort(proportions)
-        cumsum = np.cumsum(props_sorted)
-        lorenz_area = np.sum(cumsum) / n_classes  # Approximate area under Lorenz curve
+        # Find dominant class (first one on ties, as in a stable sort)
+        dominant_class, dominant_count = max(class_counts.items(), key=itemgetter(1))
+        dominance_ratio = dominant_count / total_pixels
         
         # Theoretical maximum Gini for n classes
         # Max Gini approaches (n-1)/n when one class has everything
         max_gini = (n_classes - 1) / n_classes if n_classes > 1 else 0
         
         # Step 6: Return results
-        return {
+        result = {
             'success': True,
             'value': round(gini, 3),
             'n_classes': n_classes,
@@ -250,11 +253,24 @@ def calculate_indicator(image_path: str,
             'dominance_ratio': round(dominance_ratio, 3),
             'total_pixels': int(total_pixels),
             'max_gini': round(max_gini, 3),
-            'normalized_gini': round(gini / max_gini, 3) if max_gini > 0 else 0,
+            'normalized_gini': round(gini / max_gini, 3) if max_gini > 0 else 0
+        }
+        if not detail:
+            return result
+        
+        sorted_classes = sorted(class_counts.items(), key=itemgetter(1), reverse=True)
+        
+        # Calculate Lorenz curve points for reference
+        props_sorted = np.sort(proportions)
+        cumsum = np.cumsum(props_sorted)
+        lorenz_area = np.sum(cumsum) / n_classes  # Approximate area under Lorenz curve
+        
+        result.update({
             'lorenz_area': round(lorenz_area, 3),
             'class_distribution': dict(sorted_classes[:10]),  # Top 10 classes
             'top_classes': [(name, round(count/total_pixels, 3)) for name, count in sorted_classes[:5]]
-        }
+        })
+        return result
         
     except FileNotFoundError:
         return {
@@ -270,6 +286,30 @@ def calculate_indicator(image_path: str,
         }
 
 
+# =============================================================================
+# BATCH CALCULATION
+# =============================================================================
+def calculate_indicator_batch(image_paths: List[str],
+                              semantic_colors: Dict[str, Tuple[int, int, int]] = None,
+                              n_workers: int = None,
+                              detail: bool = True) -> List[Dict]:
+    """
+    Calculate GIN for many masks on a thread pool (see _mask_cache.map_images()).
+    
+    Args:
+        image_paths: Paths to semantic segmentation mask images
+        semantic_colors: Dictionary mapping class names to RGB tuples.
+                        If not provided, auto-detects unique colors.
+        n_workers: Number of worker threads (default: os.cpu_count())
+        detail: Passed through to calculate_indicator()
+        
+    Returns:
+        list: One calculate_indicator() result dict per path, in order
+    """
+    return map_images(lambda path: calculate_indicator(path, semantic_colors, detail),
+                      image_paths, n_workers)
+
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -17,10 +17,15 @@ Description:
 Formula: GRC = (Sum(Ground_Cover_Pixels) / Sum(Total_Pixels)) × 100
 """
 
+import logging
+
 import numpy as np
-from PIL import Image
 from typing import Dict
 
+from _type_a_core import build_target_keys, compute_type_a, ratio_from_pixels
+
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -62,23 +67,30 @@ INDICATOR = {
 # This section creates a mapping from RGB values to class names
 # The semantic_colors dictionary comes from input_layer.py
 
+if 'semantic_colors' not in globals():
+    # Not injected by the loader (e.g. a bare import): nothing to match
+    semantic_colors = {}
+
 TARGET_RGB = {}
 
-print(f"\nBuilding color lookup for {INDICATOR['id']}:")
+logger.debug("Building color lookup for %s", INDICATOR['id'])
 for class_name in INDICATOR.get('target_classes', []):
     if class_name in semantic_colors:
         rgb = semantic_colors[class_name]
         TARGET_RGB[rgb] = class_name
-        print(f" {class_name}: RGB{rgb}")
+        logger.debug("%s: RGB%s", class_name, rgb)
     else:
-        print(f" ️ NOT FOUND: {class_name}")
+        logger.warning("%s: target class not found: %s", INDICATOR['id'], class_name)
         # Try partial matching to suggest corrections
         for name in semantic_colors.keys():
             if class_name.split(';')[0] in name or name.split(';')[0] in class_name:
-                print(f" Did you mean: '{name}'?")
+                logger.warning("%s: did you mean '%s'?", INDICATOR['id'], name)
                 break
 
-print(f"\nCalculator ready: {INDICATOR['id']} ({len(TARGET_RGB)} classes matched)")
+# Packed uint32 keys of the target colors, aligned with TARGET_NAMES
+TARGET_NAMES, TARGET_KEYS = build_target_keys(TARGET_RGB)
+
+logger.debug("Calculator ready: %s (%d classes matched)", INDICATOR['id'], len(TARGET_RGB))
 
 
 # =============================================================================
@@ -112,54 +124,8 @@ def calculate_indicator(image_path: str) -> Dict:
         ...     print(f"GRC: {result['value']:.2f}%")
         ...     print(f"Ground cover pixels: {result['target_pixels']}")
     """
-    try:
-        # Step 1: Load the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        
-        # Flatten pixel array for efficient comparison
-        flat_pixels = pixels.reshape(-1, 3)
-        
-        # Step 2: Count pixels for each target class (ground cover)
-        target_count = 0
-        class_counts = {}
-        
-        for rgb, class_name in TARGET_RGB.items():
-            # Find pixels that exactly match this RGB value
-            mask = np.all(flat_pixels == rgb, axis=1)
-            count = np.sum(mask)
-            
-            if count > 0:
-                class_counts[class_name] = int(count)
-                target_count += count
-        
-        # Step 3: Calculate the indicator value (ratio mode)
-        # GRC = (ground_cover_pixels / total_pixels) × 100
-        value = (target_count / total_pixels) * 100 if total_pixels > 0 else 0
-        
-        # Step 4: Return results
-        return {
-            'success': True,
-            'value': round(value, 3),
-            'target_pixels': int(target_count),
-            'total_pixels': int(total_pixels),
-            'class_breakdown': class_counts
-        }
-        
-    except FileNotFoundError:
-        return {
-            'success': False,
-            'error': f'Image file not found: {image_path}',
-            'value': None
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e),
-            'value': None
-        }
+    # Shared TYPE A calculation on the cached mask histogram
+    return compute_type_a(image_path, TARGET_NAMES, TARGET_KEYS)
 
 
 # =============================================================================
@@ -168,7 +134,7 @@ def calculate_indicator(image_path: str) -> Dict:
 if __name__ == "__main__":
     """
     Test code for standalone execution.
-    Creates a synthetic test image and validates the calculator.
+    Builds a synthetic test mask in memory and validates the calculator.
     """
     print("\nTesting calculator...")
     
@@ -190,12 +156,9 @@ if __name__ == "__main__":
         field_rgb = semantic_colors['field']
         test_img[25:30, 0:100] = field_rgb  # 5% field
     
-    # Save test image
-    test_path = '/tmp/test_grc.png'
-    Image.fromarray(test_img).save(test_path)
-    
-    # Run calculation
-    result = calculate_indicator(test_path)
+    # Run calculation on the in-memory array (same code path as
+    # calculate_indicator() after decoding, without a PNG round-trip)
+    result = ratio_from_pixels(test_img, TARGET_NAMES, TARGET_KEYS)
     print(f" Result: {result}")
     
     # Validate expected result (should be ~30%)
@@ -208,8 +171,3 @@ if __name__ == "__main__":
             print(" Test PASSED")
         else:
             print(" ️ Test result differs from expected")
-    
-    # Cleanup
-    import os
-    os.remove(test_path)
-    print(" Test cleanup complete")
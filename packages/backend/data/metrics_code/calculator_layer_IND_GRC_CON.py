@@ -193,12 +193,10 @@ if __name__ == "__main__":
 
     smooth = np.full((128, 128, 3), 128, dtype=np.uint8)
 
-    checker = np.zeros((128, 128, 3), dtype=np.uint8)
     block = 8
-    for i in range(0, 128, block):
-        for j in range(0, 128, block):
-            val = 255 if ((i // block + j // block) % 2 == 0) else 0
-            checker[i:i+block, j:j+block] = val
+    ii, jj = np.mgrid[:128, :128]
+    checker = np.zeros((128, 128, 3), dtype=np.uint8)
+    checker[(ii // block + jj // block) % 2 == 0] = 255
 
     for name, test_img in [('Smooth', smooth), ('Checker', checker)]:
         test_path = f'/tmp/test_grc_con_{name}.png'
@@ -13,10 +13,18 @@ Description:
 Formula: - RMS Contrast)
 """
 
+import logging
+import math
+import os
+
 import numpy as np
 from PIL import Image
 from typing import Dict, List, Tuple
 
+from _mask_cache import cache_by_file, load_cached_pixels
+
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -54,15 +62,28 @@ INDICATOR = {
     "note": "Works on raw image pixels, not semantic segmentation. Higher values indicate more visual contrast."
 }
 
-print(f"\nCalculator ready: {INDICATOR['id']} - {INDICATOR['name']}")
-print(f" Formula: {INDICATOR['formula']}")
-print(f" Type: TYPE B (RMS Contrast)")
+# Number of (file version -> result) entries kept by calculate_indicator()
+RESULT_CACHE_SIZE = 1024
+
+# Images are reduced in horizontal blocks of this many rows, so the
+# uint32/int32 temporaries cover one block (8 MB for 2048-wide rows)
+# instead of the whole raster (512 MB for a 16384x8192 panorama)
+BLOCK_ROWS = 1024
+
+logger.debug("Calculator ready: %s - %s", INDICATOR['id'], INDICATOR['name'])
 
 
 # =============================================================================
 # RMS CONTRAST CALCULATION
 # =============================================================================
-def calculate_rms_contrast(pixels: np.ndarray) -> Tuple[float, float, Dict]:
+def _moment_std(total: int, square_total: int, n: int) -> float:
+    """Population std from integer Sum(I), Sum(I^2) and count n."""
+    # Sum( (I - mean)^2 ) = Sum(I^2) - Sum(I)^2 / n, kept in integers so
+    # the difference does not cancel
+    return math.sqrt((n * square_total - total * total) / (n * n))
+
+
+def calculate_rms_contrast(pixels: np.ndarray, detail: bool = True) -> Tuple[float, float, Dict]:
     """
     Calculate Root Mean Square (RMS) Contrast for an image.
     
@@ -74,6 +95,7 @@ def calculate_rms_contrast(pixels: np.ndarray) -> Tuple[float, float, Dict]:
     
     Args:
         pixels: numpy array of shape (M, N, 3) with RGB values
+        detail: If False, skip the per-channel statistics (returned as None)
         
     Returns:
         Tuple containing:
@@ -81,33 +103,55 @@ def calculate_rms_contrast(pixels: np.ndarray) -> Tuple[float, float, Dict]:
         - mean_intensity: The mean intensity (I_bar)
         - channel_stats: Per-channel statistics
     """
-    # Ensure float type for calculations
-    pixels_float = pixels.astype(np.float64)
-    
     # Get dimensions
-    M, N, C = pixels_float.shape  # Height, Width, Channels (3 for RGB)
-    
-    # Calculate mean intensity across all pixels and channels
-    I_bar = np.mean(pixels_float)
-    
-    # Calculate sum of squared differences from mean
-    squared_diff_sum = np.sum((pixels_float - I_bar) ** 2)
-    
-    # Calculate RMS contrast: Sqrt( Sum / (3 * M * N) )
-    rms_contrast = np.sqrt(squared_diff_sum / (C * M * N))
-    
-    # Per-channel statistics
+    M, N, C = pixels.shape  # Height, Width, Channels (3 for RGB)
+    n_channel = M * N
+    n = C * n_channel
+    
+    blocks = [pixels[top:top + BLOCK_ROWS] for top in range(0, M, BLOCK_ROWS)]
+    
+    if not detail:
+        # Whole-image moments only: one pass each, no per-channel copies
+        intensity_sum = 0
+        square_sum = 0
+        for block in blocks:
+            intensity_sum += int(block.sum(dtype=np.int64))
+            square_sum += int(np.square(block, dtype=np.uint32).sum(dtype=np.uint64))
+        return _moment_std(intensity_sum, square_sum, n), intensity_sum / n, None
+    
+    # Per-channel statistics from exact integer moments Sum(I) and Sum(I^2)
+    # (no float64 copy of the image and no (I - mean)^2 temporaries); the
+    # whole-image moments are their totals, so no separate pass is needed
     channel_stats = {}
     channel_names = ['R', 'G', 'B']
+    intensity_sum = 0
+    square_sum = 0
     for i, name in enumerate(channel_names):
-        channel = pixels_float[:, :, i]
+        channel_sum = 0
+        channel_square_sum = 0
+        channel_min = 255
+        channel_max = 0
+        for block in blocks:
+            channel = np.ascontiguousarray(block[:, :, i])
+            channel_sum += int(channel.sum(dtype=np.int64))
+            channel_square_sum += int(np.square(channel, dtype=np.uint32).sum(dtype=np.uint64))
+            channel_min = min(channel_min, int(channel.min()))
+            channel_max = max(channel_max, int(channel.max()))
+        intensity_sum += channel_sum
+        square_sum += channel_square_sum
         channel_stats[name] = {
-            'mean': round(float(np.mean(channel)), 2),
-            'std': round(float(np.std(channel)), 2),
-            'min': int(np.min(channel)),
-            'max': int(np.max(channel))
+            'mean': round(channel_sum / n_channel, 2),
+            'std': round(_moment_std(channel_sum, channel_square_sum, n_channel), 2),
+            'min': channel_min,
+            'max': channel_max
         }
     
+    # Calculate mean intensity across all pixels and channels
+    I_bar = intensity_sum / n
+    
+    # Calculate RMS contrast: Sqrt( Sum( (I - I_bar)^2 ) / (3 * M * N) )
+    rms_contrast = _moment_std(intensity_sum, square_sum, n)
+    
     return rms_contrast, I_bar, channel_stats
 
 
@@ -123,10 +167,19 @@ def calculate_michelson_contrast(pixels: np.ndarray) -> float:
     Returns:
         float: Michelson contrast (0 to 1)
     """
-    # Convert to grayscale for Michelson
-    gray = 0.299 * pixels[:,:,0] + 0.587 * pixels[:,:,1] + 0.114 * pixels[:,:,2]
-    I_max = np.max(gray)
-    I_min = np.min(gray)
+    # Convert to grayscale for Michelson, scaled by 1000 to stay in int32
+    # (the ratio below does not depend on the scale); accumulating in place
+    # keeps a single int32 temporary per block instead of several float64
+    # images
+    I_max = 0
+    I_min = 255000
+    for top in range(0, pixels.shape[0], BLOCK_ROWS):
+        block = pixels[top:top + BLOCK_ROWS]
+        gray = np.multiply(block[:, :, 0], 299, dtype=np.int32)
+        gray += np.multiply(block[:, :, 1], 587, dtype=np.int32)
+        gray += np.multiply(block[:, :, 2], 114, dtype=np.int32)
+        I_max = max(I_max, int(gray.max()))
+        I_min = min(I_min, int(gray.min()))
     
     if I_max + I_min == 0:
         return 0.0
@@ -138,7 +191,8 @@ def calculate_michelson_contrast(pixels: np.ndarray) -> float:
 # CALCULATION FUNCTION
 # =============================================================================
 def calculate_indicator(image_path: str, 
-                        semantic_colors: Dict[str, Tuple[int, int, int]] = None) -> Dict:
+                        semantic_colors: Dict[str, Tuple[int, int, int]] = None,
+                        detail: bool = True, sample_target: int = None) -> Dict:
     """
     Calculate the Image Contrast (IMG_CON) indicator.
     
@@ -153,6 +207,16 @@ def calculate_indicator(image_path: str,
     Args:
         image_path: Path to the image file (original or mask)
         semantic_colors: Not used for this indicator (ignored)
+        detail: If False, skip the per-channel statistics, the intensity
+            range and the Michelson contrast, and return only the RMS
+            value, mean intensity and image dimensions.
+        sample_target: If set, estimate the statistics on a strided
+            subsample of about this many pixels (every s-th row and
+            column, s = floor(sqrt(M * N / sample_target))). RMS contrast
+            is a global mean, so e.g. 250_000 keeps its relative error
+            around 1/sqrt(sample_target), well within the
+            interpret_img_con() bands. Extremes (min, max, Michelson) may
+            miss isolated pixels. Default: use every pixel.
         
     Returns:
         dict: Result dictionary containing:
@@ -160,8 +224,10 @@ def calculate_indicator(image_path: str,
             - 'value' (float): RMS contrast value
             - 'mean_intensity' (float): Mean intensity (I_bar)
             - 'image_dimensions' (dict): M, N, C dimensions
-            - 'channel_stats' (dict): Per-channel statistics
-            - 'michelson_contrast' (float): Alternative contrast measure
+            - 'channel_stats' (dict): Per-channel statistics, with detail
+            - 'michelson_contrast' (float): Alternative contrast measure,
+              with detail
+            - 'sample_stride' (int): Row/column stride used, if subsampled
             - 'error' (str): Error message if success is False
             
     Example:
@@ -170,39 +236,100 @@ def calculate_indicator(image_path: str,
         ...     print(f"RMS Contrast: {result['value']:.2f}")
         ...     print(f"Mean Intensity: {result['mean_intensity']:.2f}")
     """
+    # Results are cached per file version (path, mtime, size), so asking
+    # again for an unchanged image skips the decode and the pixel passes
+    return _calculate_cached(image_path, detail, sample_target)
+
+
+@cache_by_file(RESULT_CACHE_SIZE)
+def _calculate_cached(image_path: str, detail: bool, sample_target: int) -> Dict:
+    """Calculate IMG_CON for one version of an image file (cached)."""
     try:
         # Step 1: Load and prepare the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
+        # (read-only pixels straight from the decoder, shared with other
+        # calculators working on the same image)
+        pixels = load_cached_pixels(image_path)
+    except FileNotFoundError:
+        return {
+            'success': False,
+            'error': f'Image file not found: {image_path}',
+            'value': None
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'value': None
+        }
+    return calculate_from_pixels(pixels, detail, sample_target)
+
+
+def calculate_from_pixels(pixels: np.ndarray, detail: bool = True,
+                          sample_target: int = None) -> Dict:
+    """
+    Calculate IMG_CON from decoded pixels instead of an image file.
+    
+    This is the uncached core of calculate_indicator(). calculate_for_layer()
+    hands it the layer-masked raster directly, so per-layer images neither
+    go through a temporary file nor take slots in the result cache.
+    
+    Args:
+        pixels: (M, N, 3) uint8 image
+        detail: See calculate_indicator()
+        sample_target: See calculate_indicator()
+        
+    Returns:
+        dict: Same result dictionary as calculate_indicator()
+    """
+    try:
         M, N, C = pixels.shape  # Height, Width, Channels
         total_pixels = M * N
         
+        # Optional strided subsample for very large images (a view, no copy)
+        stride = 1
+        if sample_target and total_pixels > sample_target:
+            stride = max(1, int(math.sqrt(total_pixels / sample_target)))
+            pixels = pixels[::stride, ::stride]
+        
         # Step 2: Calculate RMS Contrast
-        rms_contrast, mean_intensity, channel_stats = calculate_rms_contrast(pixels)
+        rms_contrast, mean_intensity, channel_stats = calculate_rms_contrast(pixels, detail)
+        
+        # Normalized RMS (0-1 scale, dividing by 127.5 which is half of 255)
+        normalized_rms = rms_contrast / 127.5
+        
+        image_dimensions = {
+            'M': M,
+            'N': N,
+            'C': C,
+            'total_pixels': total_pixels
+        }
+        if not detail:
+            result = {
+                'success': True,
+                'value': round(rms_contrast, 4),
+                'mean_intensity': round(mean_intensity, 2),
+                'image_dimensions': image_dimensions,
+                'normalized_rms': round(normalized_rms, 4)
+            }
+            if stride > 1:
+                result['sample_stride'] = stride
+            return result
         
         # Step 3: Calculate alternative contrast measures
         michelson = calculate_michelson_contrast(pixels)
         
         # Step 4: Additional metrics
-        # Intensity range
-        intensity_min = int(np.min(pixels))
-        intensity_max = int(np.max(pixels))
+        # Intensity range (from the per-channel extremes, no extra passes)
+        intensity_min = min(stats['min'] for stats in channel_stats.values())
+        intensity_max = max(stats['max'] for stats in channel_stats.values())
         intensity_range = intensity_max - intensity_min
         
-        # Normalized RMS (0-1 scale, dividing by 127.5 which is half of 255)
-        normalized_rms = rms_contrast / 127.5
-        
         # Step 5: Return results
-        return {
+        result = {
             'success': True,
             'value': round(rms_contrast, 4),
             'mean_intensity': round(mean_intensity, 2),
-            'image_dimensions': {
-                'M': M,
-                'N': N,
-                'C': C,
-                'total_pixels': total_pixels
-            },
+            'image_dimensions': image_dimensions,
             'channel_stats': channel_stats,
             'intensity_min': intensity_min,
             'intensity_max': intensity_max,
@@ -210,13 +337,10 @@ def calculate_indicator(image_path: str,
             'normalized_rms': round(normalized_rms, 4),
             'michelson_contrast': round(michelson, 4)
         }
+        if stride > 1:
+            result['sample_stride'] = stride
+        return result
         
-    except FileNotFoundError:
-        return {
-            'success': False,
-            'error': f'Image file not found: {image_path}',
-            'value': None
-        }
     except Exception as e:
         return {
             'success': False,
@@ -420,11 +544,11 @@ def calculate_for_layer(semantic_map_path, mask_path=None):
     to that layer before computing; else computes whole-image.
     
     The default strategy: copy semantic map, set non-mask pixels to 0
-    (which won't match any real ADE20K color), then run calculate_indicator.
+    (which won't match any real ADE20K color), then run calculate_from_pixels.
     """
     import numpy as np
     from PIL import Image
-    import tempfile, os
+    import os
     
     if not mask_path or not os.path.exists(mask_path):
         return calculate_indicator(semantic_map_path)
@@ -439,14 +563,7 @@ def calculate_for_layer(semantic_map_path, mask_path=None):
             mask_arr = np.array(m) > 127
         # Apply mask: non-mask pixels set to black (0,0,0)
         sem_arr[~mask_arr] = 0
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-            Image.fromarray(sem_arr).save(tmp.name)
-            tmp_path = tmp.name
-        try:
-            result = calculate_indicator(tmp_path)
-        finally:
-            try: os.unlink(tmp_path)
-            except: pass
-        return result
+        # Uncached: a per-layer raster must not evict real images' results
+        return calculate_from_pixels(sem_arr)
     except Exception as e:
         return {'success': False, 'value': None, 'error': f'layer-aware wrapper failed: {e}'}
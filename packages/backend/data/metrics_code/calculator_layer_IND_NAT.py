@@ -19,11 +19,22 @@ Description:
 Formula: - Deep Learning Mode: CNN model prediction (0-10 scale)
 """
 
+import logging
+
 import numpy as np
 from PIL import Image
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from importlib.metadata import version as package_version
+from importlib.util import find_spec
+from typing import Dict, List, Tuple
 import os
 
+from _mask_cache import (MAX_SAMPLE_SIDE, load_mask_keys, lookup_counts, map_images, pack_rgb,
+                         worker_count)
+
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -48,7 +59,14 @@ INDICATOR = {
         "input_size": (224, 224),
         "normalize": True,
         "mean": [0.485, 0.456, 0.406],
-        "std": [0.229, 0.224, 0.225]
+        "std": [0.229, 0.224, 0.225],
+        "compile": False,  # torch.compile the model (slow first call, faster after)
+        # On CPU, quantize the model to int8, calibrating on these sample
+        # images (a few dozen representative photos); empty = float32
+        "calibration_images": [],
+        # Used instead of model_path when onnxruntime is installed and the
+        # file exists (see export_onnx())
+        "onnx_path": "./models/naturalness_resnet50.onnx"
     },
     
     # Output Configuration
@@ -94,23 +112,69 @@ INDICATOR = {
     "note": "Higher scores indicate more natural-appearing environments; supports both DL and rule-based modes"
 }
 
-print(f"\nCalculator ready: {INDICATOR['id']} - {INDICATOR['name']}")
-print(f" Mode: {'Placeholder (rule-based)' if INDICATOR.get('use_placeholder', True) else 'Deep Learning'}")
+
+# =============================================================================
+# BUILD COLOR LOOKUP TABLES
+# =============================================================================
+# Packed uint32 keys of the natural and artificial classes found in the
+# palette, aligned with the name lists; built once at import instead of
+# on every call. The semantic_colors dictionary comes from input_layer.py
+
+if 'semantic_colors' not in globals():
+    # Not injected by the loader (e.g. a bare import): nothing to match
+    semantic_colors = {}
+
+
+def _class_keys(class_names: List[str]) -> Tuple[List[str], np.ndarray]:
+    """Names of the classes present in semantic_colors and their packed keys."""
+    names = [name for name in class_names if name in semantic_colors]
+    keys = pack_rgb(np.array([semantic_colors[name] for name in names], dtype=np.uint8).reshape(-1, 3))
+    return names, keys
+
+
+NATURAL_NAMES, NATURAL_KEYS = _class_keys(INDICATOR.get('natural_classes', []))
+ARTIFICIAL_NAMES, ARTIFICIAL_KEYS = _class_keys(INDICATOR.get('artificial_classes', []))
 
 
 # =============================================================================
 # DETECT DEEP LEARNING ENVIRONMENT
 # =============================================================================
-TORCH_AVAILABLE = False
-try:
-    import torch
+# Only probe for the backends here: importing torch/torchvision takes
+# seconds and hundreds of MB per worker process, which placeholder mode
+# (the default) never needs. They are imported on first deep learning use.
+TORCH_AVAILABLE = find_spec('torch') is not None and find_spec('torchvision') is not None
+if not TORCH_AVAILABLE:
+    logger.debug("%s: PyTorch not installed, deep learning mode unavailable "
+                 "(pip install torch torchvision)", INDICATOR['id'])
+
+# Optional ONNX Runtime backend (TensorRT / CUDA / CPU execution providers)
+ORT_AVAILABLE = find_spec('onnxruntime') is not None
+
+torch = transforms = models = ImageReadMode = read_image = None
+ort = None
+
+
+def _import_torch() -> None:
+    """Import torch and torchvision into the module namespace on first use."""
+    global torch, transforms, models, ImageReadMode, read_image
+    if torch is not None:
+        return
     import torchvision.transforms as transforms
+    from torchvision.io import ImageReadMode, read_image
     from torchvision import models
-    TORCH_AVAILABLE = True
-    print(f" PyTorch: Available (version {torch.__version__})")
-except ImportError:
-    print(f" PyTorch: Not installed")
-    print(f" To enable full DL mode: pip install torch torchvision")
+    import torch
+    # Fixed input size: let cuDNN pick the fastest convolution algorithms
+    torch.backends.cudnn.benchmark = True
+
+
+def _import_onnxruntime() -> None:
+    """Import onnxruntime into the module namespace on first use."""
+    global ort
+    if ort is None:
+        import onnxruntime as ort
+
+logger.debug("Calculator ready: %s (%s mode)", INDICATOR['id'],
+             'placeholder' if INDICATOR.get('use_placeholder', True) else 'deep learning')
 
 
 # =============================================================================
@@ -148,13 +212,36 @@ def calculate_indicator(image_path: str) -> Dict:
     """
     use_placeholder = INDICATOR.get('use_placeholder', True)
     
-    if use_placeholder or not TORCH_AVAILABLE:
+    if use_placeholder or not _deep_learning_available():
         return calculate_placeholder(image_path)
     else:
         return calculate_deep_learning(image_path)
 
 
-def calculate_placeholder(image_path: str) -> Dict:
+def count_classes(uniq_keys: np.ndarray, key_counts: np.ndarray,
+                  class_names: List[str], class_keys: np.ndarray) -> Tuple[int, Dict[str, int]]:
+    """
+    Count the pixels of the given classes in a packed-color histogram.
+    
+    One lookup of all class colors instead of a full-image comparison
+    per class.
+    
+    Args:
+        uniq_keys: Sorted packed colors from load_mask_keys()
+        key_counts: Pixel counts aligned with uniq_keys
+        class_names: Semantic class names to count
+        class_keys: Packed colors aligned with class_names
+        
+    Returns:
+        tuple: (total_count, breakdown) where breakdown maps each class
+            present in the mask to its pixel count
+    """
+    counts = lookup_counts(uniq_keys, key_counts, class_keys).tolist()
+    breakdown = {name: count for name, count in zip(class_names, counts) if count > 0}
+    return sum(counts), breakdown
+
+
+def calculate_placeholder(image_path: str, max_side: int = MAX_SAMPLE_SIDE) -> Dict:
     """
     Placeholder implementation: Rule-based naturalness estimation.
     
@@ -164,42 +251,23 @@ def calculate_placeholder(image_path: str) -> Dict:
     3. Calculate naturalness score: score = natural_ratio × 10 × (1 - artificial_ratio × 0.5)
     
     Note: This is a placeholder for testing, not a true deep learning prediction.
+    
+    max_side (default GREENSVC_MAX_SIDE, 0 = off) counts the ratios on a
+    nearest-neighbour downsample of masks larger than that; pixel counts
+    then refer to the downsampled mask.
     """
     try:
-        # Step 1: Load the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        flat_pixels = pixels.reshape(-1, 3)
+        # Step 1: Load the packed-color histogram of the mask
+        # (decoded once per file and shared with other calculators)
+        uniq_keys, key_counts, total_pixels = load_mask_keys(image_path, max_side)
         
         # Step 2: Count natural element pixels
-        natural_classes = INDICATOR.get('natural_classes', [])
-        natural_count = 0
-        natural_breakdown = {}
-        
-        for class_name in natural_classes:
-            if class_name in semantic_colors:
-                rgb = semantic_colors[class_name]
-                mask = np.all(flat_pixels == rgb, axis=1)
-                count = np.sum(mask)
-                if count > 0:
-                    natural_breakdown[class_name] = int(count)
-                    natural_count += count
+        natural_count, natural_breakdown = count_classes(
+            uniq_keys, key_counts, NATURAL_NAMES, NATURAL_KEYS)
         
         # Step 3: Count artificial element pixels
-        artificial_classes = INDICATOR.get('artificial_classes', [])
-        artificial_count = 0
-        artificial_breakdown = {}
-        
-        for class_name in artificial_classes:
-            if class_name in semantic_colors:
-                rgb = semantic_colors[class_name]
-                mask = np.all(flat_pixels == rgb, axis=1)
-                count = np.sum(mask)
-                if count > 0:
-                    artificial_breakdown[class_name] = int(count)
-                    artificial_count += count
+        artificial_count, artificial_breakdown = count_classes(
+            uniq_keys, key_counts, ARTIFICIAL_NAMES, ARTIFICIAL_KEYS)
         
         # Step 4: Calculate ratios
         natural_ratio = natural_count / total_pixels if total_pixels > 0 else 0
@@ -245,88 +313,464 @@ def calculate_placeholder(image_path: str) -> Dict:
         }
 
 
+def load_rgb_image(image_path: str) -> Image.Image:
+    """
+    Open an image as a decoded RGB PIL image for the model transforms.
+    
+    Skips the convert('RGB') copy when the file is already RGB; for JPEG,
+    draft() lets the decoder emit RGB directly.
+    
+    Args:
+        image_path: Path to the original image
+        
+    Returns:
+        PIL.Image.Image: Loaded RGB image (file handle already closed)
+    """
+    with Image.open(image_path) as img:
+        img.draft('RGB', img.size)
+        if img.mode != 'RGB':
+            return img.convert('RGB')
+        img.load()
+        return img
+
+
+@lru_cache(maxsize=4)
+def _get_model(model_path: str, model_type: str, device_name: str,
+               input_size: Tuple[int, int], mean: Tuple[float, ...], std: Tuple[float, ...],
+               compile_model: bool = False, calibration_paths: Tuple[str, ...] = None):
+    """
+    Build, load and cache the model and its input transform.
+    
+    Constructing ResNet50 and loading the checkpoint costs far more than a
+    single forward pass, so it is done once per (model, device, transform)
+    configuration and reused for every image. The returned model is shared
+    and must only be used for inference.
+    
+    Args:
+        model_path: Path to the checkpoint (state dict)
+        model_type: Model architecture, only 'ResNet50' is supported
+        device_name: torch device string ('cuda' or 'cpu')
+        input_size: Model input size (height, width)
+        mean: Per-channel normalization mean
+        std: Per-channel normalization std
+        compile_model: Wrap the model in torch.compile (operator fusion;
+            compiles on the first forward pass)
+        calibration_paths: On CPU, statically quantize the model to int8,
+            calibrating on these images (None = keep float32)
+        
+    Returns:
+        tuple: (model, transform) where transform maps an image path to a
+            normalized (3, H, W) float tensor
+    """
+    # Image preprocessing
+    if device_name == 'cuda':
+        transform = _device_transform(torch.device(device_name), input_size, mean, std)
+    else:
+        array_transform = _array_transform(input_size, mean, std)
+        transform = lambda image_path: torch.from_numpy(array_transform(image_path))
+    
+    if model_type != 'ResNet50':
+        raise ValueError(f"Unsupported model type: {model_type}")
+    if calibration_paths and device_name == 'cpu':
+        return _quantized_resnet50(model_path, transform, calibration_paths), transform
+    
+    model = models.resnet50(pretrained=False)
+    model.fc = torch.nn.Linear(model.fc.in_features, 1)  # Regression output
+    
+    # Load weights
+    model.load_state_dict(torch.load(model_path, map_location='cpu'))
+    model.eval()
+    
+    # GPU support
+    model = model.to(torch.device(device_name))
+    if device_name == 'cuda':
+        # Half precision on GPU (tensor cores); negligible effect on the
+        # regression output
+        model = model.half()
+    # NHWC weights: cuDNN and oneDNN pick their faster channels-last
+    # convolution kernels (inputs are converted to match in _run_model)
+    model = model.to(memory_format=torch.channels_last)
+    if compile_model and hasattr(torch, 'compile'):
+        model = torch.compile(model, mode='reduce-overhead' if device_name == 'cuda' else 'default')
+    return model, transform
+
+
+def _quantized_resnet50(model_path: str, transform, calibration_paths: Tuple[str, ...]):
+    """
+    Build a statically int8-quantized ResNet50 (FBGEMM) for CPU inference.
+    
+    Conv+BN+ReLU are fused and every convolution runs on int8 kernels
+    (VNNI where available). Activation ranges are calibrated on a few
+    representative images; dynamic quantization would only cover the
+    final Linear layer of this model.
+    
+    Args:
+        model_path: Path to the float checkpoint (state dict)
+        transform: Input transform, as from _get_model()
+        calibration_paths: Images to calibrate activation ranges on
+        
+    Returns:
+        torch.nn.Module: Quantized model in eval mode
+    """
+    from torchvision.models import quantization as quantized_models
+    
+    model = quantized_models.resnet50(pretrained=False, quantize=False)
+    model.fc = torch.nn.Linear(model.fc.in_features, 1)  # Regression output
+    model.load_state_dict(torch.load(model_path, map_location='cpu'))
+    model.eval()
+    
+    model.fuse_model()
+    torch.backends.quantized.engine = 'fbgemm'
+    model.qconfig = torch.ao.quantization.get_default_qconfig('fbgemm')
+    torch.ao.quantization.prepare(model, inplace=True)
+    # Observers record activation ranges in place, so calibrate under
+    # no_grad rather than inference_mode
+    with torch.no_grad():
+        for image_path in calibration_paths:
+            model(transform(image_path).unsqueeze(0))
+    torch.ao.quantization.convert(model, inplace=True)
+    return model
+
+
+def _normalize_coefficients(mean: Tuple[float, ...], std: Tuple[float, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fold ToTensor's / 255 and Normalize into one multiply-add.
+    
+    (x / 255 - mean) / std == x * scale + shift with scale = 1 / (255 * std)
+    and shift = -mean / std, so uint8 pixels are normalized in a single
+    in-place pass instead of a divide pass plus a subtract/divide pass.
+    
+    Returns:
+        tuple: (scale, shift) as float32 (C, 1, 1) arrays
+    """
+    mean = np.array(mean, dtype=np.float32).reshape(-1, 1, 1)
+    std = np.array(std, dtype=np.float32).reshape(-1, 1, 1)
+    return 1 / (255 * std), -mean / std
+
+
+def _array_transform(input_size: Tuple[int, int], mean: Tuple[float, ...], std: Tuple[float, ...]):
+    """
+    Build a path -> normalized (3, H, W) float32 array transform on the CPU.
+    
+    Same result as torchvision's Compose([Resize, ToTensor, Normalize]) on
+    a PIL image (bilinear resize), with the scaling and normalization fused.
+    """
+    scale, shift = _normalize_coefficients(mean, std)
+    
+    def transform(image_path: str) -> np.ndarray:
+        img = load_rgb_image(image_path).resize((input_size[1], input_size[0]), Image.BILINEAR)
+        chw = np.asarray(img).transpose(2, 0, 1).astype(np.float32, order='C')
+        chw *= scale
+        chw += shift
+        return chw
+    
+    return transform
+
+
+def _device_transform(device, input_size: Tuple[int, int],
+                      mean: Tuple[float, ...], std: Tuple[float, ...]):
+    """
+    Build a path -> tensor transform that resizes and normalizes on the device.
+    
+    Only the decode runs on the CPU: the uint8 image is copied to the
+    device (a quarter of the float32 size) and resize, scaling and
+    normalization run there.
+    """
+    scale, shift = (torch.from_numpy(c).to(device) for c in _normalize_coefficients(mean, std))
+    
+    def transform(image_path: str):
+        try:
+            img = read_image(image_path, ImageReadMode.RGB)
+        except RuntimeError:
+            # Format torchvision cannot decode: go through PIL
+            img = transforms.functional.pil_to_tensor(load_rgb_image(image_path))
+        img = img.to(device, non_blocking=True)
+        img = transforms.functional.resize(img, list(input_size), antialias=True)
+        return img.float().mul_(scale).add_(shift)
+    
+    return transform
+
+
+@lru_cache(maxsize=4)
+def _get_onnx_model(onnx_path: str, input_size: Tuple[int, int],
+                    mean: Tuple[float, ...], std: Tuple[float, ...]):
+    """
+    Create and cache an ONNX Runtime session and its NumPy input transform.
+    
+    Execution providers are tried in TensorRT, CUDA, CPU order, whichever
+    the installed onnxruntime build offers. Needs no PyTorch.
+    
+    Args:
+        onnx_path: Path to the exported model (see export_onnx())
+        input_size: Model input size (height, width)
+        mean: Per-channel normalization mean
+        std: Per-channel normalization std
+        
+    Returns:
+        tuple: (predict, transform, provider) where transform maps an image
+            path to a normalized (3, H, W) float32 array and predict maps a
+            list of them to raw model outputs
+    """
+    _import_onnxruntime()
+    available = ort.get_available_providers()
+    providers = [name for name in ('TensorrtExecutionProvider', 'CUDAExecutionProvider',
+                                   'CPUExecutionProvider') if name in available]
+    session = ort.InferenceSession(onnx_path, providers=providers)
+    input_name = session.get_inputs()[0].name
+    
+    def predict(images: List[np.ndarray]) -> List[float]:
+        output = session.run(None, {input_name: np.stack(images)})[0]
+        return np.asarray(output, dtype=np.float64).reshape(-1).tolist()
+    
+    # Same preprocessing as the PyTorch CPU path
+    return predict, _array_transform(input_size, mean, std), session.get_providers()[0]
+
+
+def _configured_model_path() -> str:
+    """Model file to load: the ONNX export if it can be used, else the checkpoint."""
+    model_config = INDICATOR.get('model_config', {})
+    onnx_path = model_config.get('onnx_path', '')
+    if ORT_AVAILABLE and onnx_path and os.path.exists(onnx_path):
+        return onnx_path
+    return model_config.get('model_path', '')
+
+
+def _deep_learning_available() -> bool:
+    """
+    Whether an installed backend can run the configured model.
+    
+    PyTorch loads the checkpoint; without it, ONNX Runtime alone only helps
+    when _configured_model_path() picked an existing ONNX export.
+    Otherwise the calculators fall back to the placeholder, as they did
+    before the ONNX Runtime backend existed.
+    
+    Returns:
+        bool: True if deep learning mode can be used
+    """
+    if TORCH_AVAILABLE:
+        return True
+    onnx_path = INDICATOR.get('model_config', {}).get('onnx_path')
+    return bool(onnx_path) and _configured_model_path() == onnx_path
+
+
+def _load_configured_model():
+    """
+    Get the cached model for INDICATOR['model_config'] on the best device.
+    
+    Uses the ONNX Runtime session when _configured_model_path() picks the
+    ONNX export, PyTorch otherwise.
+    
+    Returns:
+        tuple: (predict, transform, device, model_type) where predict maps
+            a list of transformed images to their raw outputs
+    """
+    model_config = INDICATOR.get('model_config', {})
+    model_type = model_config.get('model_type', 'ResNet50')
+    model_path = _configured_model_path()
+    input_size = tuple(model_config.get('input_size', (224, 224)))
+    mean = tuple(model_config.get('mean', [0.485, 0.456, 0.406]))
+    std = tuple(model_config.get('std', [0.229, 0.224, 0.225]))
+    
+    if model_path == model_config.get('onnx_path'):
+        predict, transform, provider = _get_onnx_model(model_path, input_size, mean, std)
+        return predict, transform, provider, model_type
+    if not TORCH_AVAILABLE:
+        raise RuntimeError(f"PyTorch is required to load {model_path}")
+    _import_torch()
+    
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model, transform = _get_model(model_path, model_type, device.type, input_size, mean, std,
+                                  bool(model_config.get('compile', False)),
+                                  tuple(model_config.get('calibration_images') or ()) or None)
+    
+    def predict(images: list) -> List[float]:
+        return _run_model(model, torch.stack(images), device)
+    
+    return predict, transform, device, model_type
+
+
+def export_onnx(onnx_path: str = None) -> str:
+    """
+    Export the configured PyTorch checkpoint to ONNX for the ORT backend.
+    
+    The batch dimension is dynamic, so the export serves both single-image
+    and batched inference. TensorRT builds (and caches) its engine from
+    this file on first use when its execution provider is available.
+    
+    Args:
+        onnx_path: Output path (default: model_config['onnx_path'])
+        
+    Returns:
+        str: Path of the written ONNX file
+    """
+    _import_torch()
+    model_config = INDICATOR.get('model_config', {})
+    onnx_path = onnx_path or model_config.get('onnx_path')
+    input_size = tuple(model_config.get('input_size', (224, 224)))
+    model, _ = _get_model(model_config.get('model_path', ''), model_config.get('model_type', 'ResNet50'),
+                          'cpu', input_size,
+                          tuple(model_config.get('mean', [0.485, 0.456, 0.406])),
+                          tuple(model_config.get('std', [0.229, 0.224, 0.225])))
+    dummy_input = torch.zeros((1, 3) + input_size)
+    torch.onnx.export(model, dummy_input, onnx_path, opset_version=17,
+                      input_names=['input'], output_names=['output'],
+                      dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}})
+    return onnx_path
+
+
+def _run_model(model, img_tensor, device) -> List[float]:
+    """Run one forward pass over a (B, 3, H, W) batch; returns B raw outputs."""
+    img_tensor = img_tensor.to(device, memory_format=torch.channels_last, non_blocking=True)
+    if device.type == 'cuda':
+        img_tensor = img_tensor.half()
+    
+    # Inference (inference_mode also skips autograd's version tracking)
+    with torch.inference_mode():
+        output = model(img_tensor)
+    return output.float().reshape(-1).cpu().tolist()
+
+
+def _deep_learning_result(raw_value: float, model_type: str, device) -> Dict:
+    """Build the result dict for one raw model output."""
+    # Clamp to output range
+    output_range = INDICATOR.get('output_range', [0, 10])
+    value = max(output_range[0], min(output_range[1], raw_value))
+    
+    return {
+        'success': True,
+        'value': round(value, 3),
+        'method': 'deep_learning',
+        'model_type': model_type,
+        'raw_output': round(raw_value, 4),
+        'device': str(device),
+        'confidence': None  # Regression model has no confidence
+    }
+
+
+def _model_missing_result(model_path: str) -> Dict:
+    return {
+        'success': False,
+        'error': f'Model file not found: {model_path}',
+        'value': None,
+        'method': 'deep_learning',
+        'fallback': 'Set use_placeholder=True or provide model file'
+    }
+
+
+def _deep_learning_error(e: Exception) -> Dict:
+    return {
+        'success': False,
+        'error': str(e),
+        'value': None,
+        'method': 'deep_learning'
+    }
+
+
 def calculate_deep_learning(image_path: str) -> Dict:
     """
     Full implementation: Deep learning model prediction.
     
     Requires:
-    - PyTorch
+    - PyTorch, or onnxruntime with an ONNX export of the model
     - Pre-trained model file
     """
     try:
-        model_config = INDICATOR.get('model_config', {})
-        model_path = model_config.get('model_path', '')
+        model_path = _configured_model_path()
         
         # Check model file exists
         if not os.path.exists(model_path):
-            return {
-                'success': False,
-                'error': f'Model file not found: {model_path}',
-                'value': None,
-                'method': 'deep_learning',
-                'fallback': 'Set use_placeholder=True or provide model file'
-            }
-        
-        # Create model
-        model_type = model_config.get('model_type', 'ResNet50')
-        
-        if model_type == 'ResNet50':
-            model = models.resnet50(pretrained=False)
-            model.fc = torch.nn.Linear(model.fc.in_features, 1)  # Regression output
-        else:
-            raise ValueError(f"Unsupported model type: {model_type}")
+            return _model_missing_result(model_path)
         
-        # Load weights
-        model.load_state_dict(torch.load(model_path, map_location='cpu'))
-        model.eval()
+        # Model and transform (built once, then cached)
+        predict, transform, device, model_type = _load_configured_model()
         
-        # GPU support
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        model = model.to(device)
+        # Load, transform and run the image
+        raw_value = predict([transform(image_path)])[0]
+        return _deep_learning_result(raw_value, model_type, device)
         
-        # Image preprocessing
-        input_size = model_config.get('input_size', (224, 224))
-        mean = model_config.get('mean', [0.485, 0.456, 0.406])
-        std = model_config.get('std', [0.229, 0.224, 0.225])
-        
-        transform = transforms.Compose([
-            transforms.Resize(input_size),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=mean, std=std)
-        ])
-        
-        # Load and transform image
-        img = Image.open(image_path).convert('RGB')
-        img_tensor = transform(img).unsqueeze(0).to(device)
-        
-        # Inference
-        with torch.no_grad():
-            output = model(img_tensor)
-        
-        # Process output
-        raw_value = float(output.squeeze().cpu().numpy())
+    except Exception as e:
+        return _deep_learning_error(e)
+
+
+def calculate_deep_learning_batch(image_paths: List[str], batch_size: int = 32,
+                                  n_workers: int = None) -> List[Dict]:
+    """
+    Deep learning prediction for many images, batch_size images per forward pass.
+    
+    Images are decoded and transformed on a thread pool (PIL decoding and
+    the tensor ops release the GIL); the next batch is prepared while the
+    current one runs through the model. An image that fails to load gets
+    its own error result without failing the rest of its batch.
+    
+    Args:
+        image_paths: Paths to the original images
+        batch_size: Number of images per forward pass
+        n_workers: Number of preprocessing threads (default: os.cpu_count())
         
-        # Clamp to output range
-        output_range = INDICATOR.get('output_range', [0, 10])
-        value = max(output_range[0], min(output_range[1], raw_value))
+    Returns:
+        list: One result dict (as from calculate_deep_learning()) per path, in order
+    """
+    try:
+        model_path = _configured_model_path()
+        if not os.path.exists(model_path):
+            return [_model_missing_result(model_path) for _ in image_paths]
+        predict, transform, device, model_type = _load_configured_model()
+    except Exception as e:
+        return [_deep_learning_error(e) for _ in image_paths]
+    
+    results = [None] * len(image_paths)
+    batch_size = max(1, batch_size)
+    with ThreadPoolExecutor(max_workers=worker_count(n_workers, len(image_paths))) as pool:
+        def submit(start):
+            return [(i, pool.submit(transform, image_paths[i]))
+                    for i in range(start, min(start + batch_size, len(image_paths)))]
         
-        return {
-            'success': True,
-            'value': round(value, 3),
-            'method': 'deep_learning',
-            'model_type': model_type,
-            'raw_output': round(raw_value, 4),
-            'device': str(device),
-            'confidence': None  # Regression model has no confidence
-        }
+        pending = submit(0)
+        for start in range(0, len(image_paths), batch_size):
+            batch, pending = pending, submit(start + batch_size)
+            
+            indices, tensors = [], []
+            for i, future in batch:
+                try:
+                    tensors.append(future.result())
+                    indices.append(i)
+                except Exception as e:
+                    results[i] = _deep_learning_error(e)
+            if not tensors:
+                continue
+            
+            try:
+                raw_values = predict(tensors)
+                for i, raw_value in zip(indices, raw_values):
+                    results[i] = _deep_learning_result(raw_value, model_type, device)
+            except Exception as e:
+                for i in indices:
+                    results[i] = _deep_learning_error(e)
+    return results
+
+
+def calculate_indicator_batch(image_paths: List[str], batch_size: int = 32,
+                              n_workers: int = None) -> List[Dict]:
+    """
+    Calculate NAT for many images.
+    
+    In deep learning mode the images are run through the model in batches
+    (see calculate_deep_learning_batch()); in placeholder mode the masks
+    are processed on a thread pool.
+    
+    Args:
+        image_paths: Paths to the images (masks for placeholder, originals for DL mode)
+        batch_size: Images per forward pass (deep learning mode only)
+        n_workers: Number of worker threads (default: os.cpu_count())
         
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e),
-            'value': None,
-            'method': 'deep_learning'
-        }
+    Returns:
+        list: One calculate_indicator() result dict per path, in order
+    """
+    use_placeholder = INDICATOR.get('use_placeholder', True)
+    
+    if use_placeholder or not _deep_learning_available():
+        return map_images(calculate_placeholder, image_paths, n_workers)
+    return calculate_deep_learning_batch(image_paths, batch_size, n_workers)
 
 
 # =============================================================================
@@ -348,10 +792,38 @@ def interpret_naturalness(score: float) -> str:
         return "Highly natural environment"
 
 
+def get_info() -> Dict:
+    """
+    Get the calculator configuration and deep learning environment.
+    
+    Returns:
+        dict: 'id', 'name', 'mode' ('placeholder' or 'deep_learning' as
+            configured), 'torch_available', 'torch_version' and
+            'onnxruntime_available'
+    """
+    return {
+        'id': INDICATOR['id'],
+        'name': INDICATOR['name'],
+        'mode': 'placeholder' if INDICATOR.get('use_placeholder', True) else 'deep_learning',
+        'torch_available': TORCH_AVAILABLE,
+        'torch_version': package_version('torch') if TORCH_AVAILABLE else None,
+        'onnxruntime_available': ORT_AVAILABLE
+    }
+
+
 # =============================================================================
 # STANDALONE TEST (Optional)
 # =============================================================================
 if __name__ == "__main__":
+    info = get_info()
+    print(f"\nCalculator ready: {info['id']} - {info['name']}")
+    print(f" Mode: {'Placeholder (rule-based)' if info['mode'] == 'placeholder' else 'Deep Learning'}")
+    if info['torch_available']:
+        print(f" PyTorch: Available (version {info['torch_version']})")
+    else:
+        print(f" PyTorch: Not installed")
+        print(f" To enable full DL mode: pip install torch torchvision")
+    
     print("\nTesting Naturalness Index calculator...")
     
     # Create test image - High naturalness (mostly green)
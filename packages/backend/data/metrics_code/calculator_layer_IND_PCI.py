@@ -14,10 +14,17 @@ Description:
 Formula: PCI = (P_chair + P_toilet + P_bench + P_stool + P_trashcan +
 """
 
+import logging
+from functools import lru_cache
+
 import numpy as np
 from PIL import Image
 from typing import Dict, List, Tuple
 
+from _mask_cache import MAX_SAMPLE_SIDE, keyword_matcher, load_mask_keys, lookup_counts, pack_rgb
+
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -61,9 +68,7 @@ INDICATOR = {
     "note": "Higher values indicate more public amenities visible in the scene"
 }
 
-print(f"\nCalculator ready: {INDICATOR['id']} - {INDICATOR['name']}")
-print(f" Formula: {INDICATOR['formula']}")
-print(f" Type: TYPE A (Simple Pixel Ratio)")
+logger.debug("Calculator ready: %s", INDICATOR['id'])
 
 
 # =============================================================================
@@ -84,6 +89,9 @@ FACILITY_KEYWORDS = [
     "bulletinboard", "bulletin board", "bulletin_board", "signboard", "notice board"
 ]
 
+# All keywords as one case-insensitive regex, matched once per class name
+FACILITY_MATCHER = keyword_matcher(FACILITY_KEYWORDS)
+
 # Default facility colors (if no semantic config provided)
 # These are commonly used colors in segmentation datasets
 DEFAULT_FACILITY_COLORS = {
@@ -105,21 +113,41 @@ def is_facility_class(class_name: str) -> bool:
     Returns:
         bool: True if class is a public facility
     """
-    class_lower = class_name.lower().replace("-", " ").replace("_", " ")
-    
-    for keyword in FACILITY_KEYWORDS:
-        keyword_lower = keyword.lower()
-        if keyword_lower in class_lower:
-            return True
+    return FACILITY_MATCHER(class_name)
+
+
+@lru_cache(maxsize=16)
+def _facility_table(colors: Tuple[Tuple[str, Tuple[int, int, int]], ...]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Facility class names and packed keys of a palette (cached per palette).
     
-    return False
+    Args:
+        colors: (class_name, rgb) pairs of the palette
+        
+    Returns:
+        tuple: (names, keys, unique_keys) where keys are the packed colors
+            aligned with names and unique_keys the distinct sorted ones
+    """
+    facility = [(class_name, rgb) for class_name, rgb in colors if is_facility_class(class_name)]
+    names = [class_name for class_name, _ in facility]
+    keys = pack_rgb(np.array([rgb for _, rgb in facility], dtype=np.uint8).reshape(-1, 3))
+    unique_keys = np.unique(keys)
+    # Shared between calls: make sure nobody mutates the cached arrays
+    keys.setflags(write=False)
+    unique_keys.setflags(write=False)
+    return names, keys, unique_keys
+
+
+# Facility table of the fallback colors (all of them are facility classes)
+DEFAULT_FACILITY_TABLE = _facility_table(tuple(DEFAULT_FACILITY_COLORS.items()))
 
 
 # =============================================================================
 # CALCULATION FUNCTION
 # =============================================================================
 def calculate_indicator(image_path: str, 
-                        semantic_colors: Dict[str, Tuple[int, int, int]] = None) -> Dict:
+                        semantic_colors: Dict[str, Tuple[int, int, int]] = None,
+                        max_side: int = MAX_SAMPLE_SIDE) -> Dict:
     """
     Calculate the Public-Facility Convenience Index (PCI) indicator.
     
@@ -135,6 +163,10 @@ def calculate_indicator(image_path: str,
         image_path: Path to the semantic segmentation mask image
         semantic_colors: Dictionary mapping class names to RGB tuples.
                         If not provided, uses default facility colors.
+        max_side: If non-zero, count on a nearest-neighbour downsample of
+                  masks whose longest side exceeds it (default:
+                  GREENSVC_MAX_SIDE, 0 = full resolution). Pixel counts
+                  then refer to the downsampled mask.
         
     Returns:
         dict: Result dictionary containing:
@@ -154,36 +186,32 @@ def calculate_indicator(image_path: str,
         ...     print(f"Facility coverage: {result['facility_coverage_pct']:.2f}%")
     """
     try:
-        # Step 1: Load and prepare the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        
-        # Step 2: Create facility mask and count by class
-        facility_mask = np.zeros((h, w), dtype=np.uint8)
-        facility_classes_found = {}
+        # Step 1: Load the packed-color histogram of the mask
+        # (decoded once per file and shared with other calculators)
+        uniq_keys, key_counts, total_pixels = load_mask_keys(image_path, max_side)
         
+        # Step 2: Count facility pixels by class
+        # (facility names and keys are derived once per palette and cached)
         if semantic_colors:
             # Use provided semantic color configuration
-            for class_name, rgb in semantic_colors.items():
-                if is_facility_class(class_name):
-                    mask = np.all(pixels == rgb, axis=2)
-                    count = int(np.sum(mask))
-                    if count > 0:
-                        facility_mask[mask] = 1
-                        facility_classes_found[class_name] = count
+            facility_names, facility_keys, unique_keys = _facility_table(
+                tuple((class_name, tuple(rgb)) for class_name, rgb in semantic_colors.items()))
         else:
             # Use default facility colors (fallback)
-            for class_name, rgb in DEFAULT_FACILITY_COLORS.items():
-                mask = np.all(pixels == rgb, axis=2)
-                count = int(np.sum(mask))
-                if count > 0:
-                    facility_mask[mask] = 1
-                    facility_classes_found[class_name] = count
+            facility_names, facility_keys, unique_keys = DEFAULT_FACILITY_TABLE
+        
+        # One lookup of all facility colors instead of a full-image
+        # comparison per class
+        counts = lookup_counts(uniq_keys, key_counts, facility_keys)
+        facility_classes_found = {
+            class_name: count
+            for class_name, count in zip(facility_names, counts.tolist())
+            if count > 0
+        }
         
         # Step 3: Calculate PCI
-        facility_pixels = int(np.sum(facility_mask > 0))
+        # Classes sharing a color cover the same pixels: count each color once
+        facility_pixels = int(lookup_counts(uniq_keys, key_counts, unique_keys).sum())
         pci = facility_pixels / total_pixels if total_pixels > 0 else 0.0
         
         # Step 4: Calculate additional metrics
@@ -269,6 +297,21 @@ def get_facility_categories() -> Dict[str, List[str]]:
     }
 
 
+def get_info() -> Dict:
+    """
+    Get the calculator identity and formula.
+    
+    Returns:
+        dict: 'id', 'name', 'formula' and 'type'
+    """
+    return {
+        'id': INDICATOR['id'],
+        'name': INDICATOR['name'],
+        'formula': INDICATOR['formula'],
+        'type': 'TYPE A (Simple Pixel Ratio)'
+    }
+
+
 def explain_formula() -> str:
     """
     Provide educational explanation of the PCI formula.
@@ -316,6 +359,11 @@ def explain_formula() -> str:
 if __name__ == "__main__":
     import os
     
+    info = get_info()
+    print(f"\nCalculator ready: {info['id']} - {info['name']}")
+    print(f" Formula: {info['formula']}")
+    print(f" Type: {info['type']}")
+    
     print("\nTesting Public-Facility Convenience Index calculator...")
     
     # Test 1: No facilities (all sky)
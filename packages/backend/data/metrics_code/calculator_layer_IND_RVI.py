@@ -16,10 +16,15 @@ Description:
 Formula: RVI = (Sum(Road_Pixels) / Sum(Total_Pixels)) × 100
 """
 
+import logging
+
 import numpy as np
 from PIL import Image
 from typing import Dict
 
+from _type_a_core import build_target_keys, compute_type_a
+
+logger = logging.getLogger(__name__)
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -62,23 +67,30 @@ INDICATOR = {
 # This section creates a mapping from RGB values to class names
 # The semantic_colors dictionary comes from input_layer.py
 
+if 'semantic_colors' not in globals():
+    # Not injected by the loader (e.g. a bare import): nothing to match
+    semantic_colors = {}
+
 TARGET_RGB = {}
 
-print(f"\nBuilding color lookup for {INDICATOR['id']}:")
+logger.debug("Building color lookup for %s", INDICATOR['id'])
 for class_name in INDICATOR.get('target_classes', []):
     if class_name in semantic_colors:
         rgb = semantic_colors[class_name]
         TARGET_RGB[rgb] = class_name
-        print(f" {class_name}: RGB{rgb}")
+        logger.debug("%s: RGB%s", class_name, rgb)
     else:
-        print(f" ️ NOT FOUND: {class_name}")
+        logger.warning("%s: target class not found: %s", INDICATOR['id'], class_name)
         # Try partial matching to suggest corrections
         for name in semantic_colors.keys():
             if class_name.split(';')[0] in name or name.split(';')[0] in class_name:
-                print(f" Did you mean: '{name}'?")
+                logger.warning("%s: did you mean '%s'?", INDICATOR['id'], name)
                 break
 
-print(f"\nCalculator ready: {INDICATOR['id']} ({len(TARGET_RGB)} classes matched)")
+# Packed uint32 keys of the target colors, aligned with TARGET_NAMES
+TARGET_NAMES, TARGET_KEYS = build_target_keys(TARGET_RGB)
+
+logger.debug("Calculator ready: %s (%d classes matched)", INDICATOR['id'], len(TARGET_RGB))
 
 
 # =============================================================================
@@ -112,54 +124,8 @@ def calculate_indicator(image_path: str) -> Dict:
         ...     print(f"RVI: {result['value']:.2f}%")
         ...     print(f"Road pixels: {result['target_pixels']}")
     """
-    try:
-        # Step 1: Load the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        
-        # Flatten pixel array for efficient comparison
-        flat_pixels = pixels.reshape(-1, 3)
-        
-        # Step 2: Count pixels for each target class (road)
-        target_count = 0
-        class_counts = {}
-        
-        for rgb, class_name in TARGET_RGB.items():
-            # Find pixels that exactly match this RGB value
-            mask = np.all(flat_pixels == rgb, axis=1)
-            count = np.sum(mask)
-            
-            if count > 0:
-                class_counts[class_name] = int(count)
-                target_count += count
-        
-        # Step 3: Calculate the indicator value (ratio mode)
-        # RVI = (road_pixels / total_pixels) × 100
-        value = (target_count / total_pixels) * 100 if total_pixels > 0 else 0
-        
-        # Step 4: Return results
-        return {
-            'success': True,
-            'value': round(value, 3),
-            'target_pixels': int(target_count),
-            'total_pixels': int(total_pixels),
-            'class_breakdown': class_counts
-        }
-        
-    except FileNotFoundError:
-        return {
-            'success': False,
-            'error': f'Image file not found: {image_path}',
-            'value': None
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e),
-            'value': None
-        }
+    # Shared TYPE A calculation on the cached mask histogram
+    return compute_type_a(image_path, TARGET_NAMES, TARGET_KEYS)
 
 
 # =============================================================================
@@ -20,6 +20,8 @@ import numpy as np
 from PIL import Image
 from typing import Dict, List, Tuple
 
+from _mask_cache import load_cached_pixels, lookup_counts, pack_rgb
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -73,11 +75,46 @@ SKY_KEYWORDS = ["sky", "cloud", "clouds"]
 # Default sky color (if no semantic config provided)
 DEFAULT_SKY_COLOR = (70, 130, 180)  # Steel blue - common sky color in segmentation
 
+# Rows per block of the fallback sky heuristic: keeps its temporaries
+# cache-sized (64 rows of a 4096-wide image are 256K pixels)
+FALLBACK_BLOCK_ROWS = 64
+
+
+def detect_sky_fallback(pixels: np.ndarray) -> np.ndarray:
+    """
+    Detect sky-like pixels by color when no semantic config is provided.
+    
+    Sky typically: high blue, moderate-high overall brightness, i.e.
+    (b > 150) & (b > r) & (b > g) & (r + g + b > 300). The predicate is
+    evaluated block by block straight into the output mask, so the
+    intermediate comparisons stay in cache instead of five full-size
+    temporaries plus a scatter into the mask.
+    
+    Args:
+        pixels: (H, W, 3) uint8 RGB array
+        
+    Returns:
+        np.ndarray: (H, W) uint8 mask where 1 = sky-like pixel
+    """
+    h, w, _ = pixels.shape
+    sky_like = np.empty((h, w), dtype=bool)
+    for top in range(0, h, FALLBACK_BLOCK_ROWS):
+        block = pixels[top:top + FALLBACK_BLOCK_ROWS]
+        r, g, b = block[:, :, 0], block[:, :, 1], block[:, :, 2]
+        out = sky_like[top:top + FALLBACK_BLOCK_ROWS]
+        np.greater(b, 150, out=out)
+        out &= b > r
+        out &= b > g
+        # Sum in int16: a uint8 sum wraps around and never exceeds 300
+        out &= (r.astype(np.int16) + g + b) > 300
+    return sky_like.view(np.uint8)
+
 
 # =============================================================================
 # VIEW FACTOR CALCULATION
 # =============================================================================
-def calculate_sky_view_factor(sky_mask: np.ndarray, n_bands: int = 10) -> Dict:
+def calculate_sky_view_factor(sky_mask: np.ndarray, n_bands: int = 10,
+                              detail: bool = True) -> Dict:
     """
     Calculate weighted Sky View Factor using horizontal bands.
     
@@ -94,6 +131,7 @@ def calculate_sky_view_factor(sky_mask: np.ndarray, n_bands: int = 10) -> Dict:
     Args:
         sky_mask: Binary mask where 1 = sky pixel, 0 = non-sky
         n_bands: Number of horizontal bands to divide the image
+        detail: If False, skip the per-band 'band_results' list.
         
     Returns:
         Dictionary with VF_sky and band details
@@ -101,43 +139,48 @@ def calculate_sky_view_factor(sky_mask: np.ndarray, n_bands: int = 10) -> Dict:
     h, w = sky_mask.shape
     band_height = h // n_bands
     
-    total_weighted_sky = 0.0
-    total_weight = 0.0
-    band_results = []
+    # Band boundaries: bands of h // n rows, the last one takes the rest
+    y_starts = np.arange(n_bands, dtype=np.int64) * band_height
+    y_ends = y_starts + band_height
+    y_ends[-1] = h
     
-    for i in range(1, n_bands + 1):
-        # Calculate band boundaries
-        y_start = (i - 1) * band_height
-        y_end = i * band_height if i < n_bands else h
-        
-        # Extract band from sky mask
-        band_mask = sky_mask[y_start:y_end, :]
-        
-        # Count sky pixels and total pixels in band
-        sky_i = np.sum(band_mask > 0)  # Sky pixels
-        t_i = band_mask.size            # Total pixels
-        
-        # Calculate band sky ratio
-        band_ratio = sky_i / t_i if t_i > 0 else 0
-        
-        # Calculate weight: w_i = (n - i + 1) / n
-        # Top bands (i=1) have highest weight, bottom bands (i=n) have lowest
-        # This gives a linear decrease from top to bottom
-        w_i = (n_bands - i + 1) / n_bands
-        
-        band_results.append({
-            'band': i,
-            'y_start': int(y_start),
-            'y_end': int(y_end),
-            'sky_pixels': int(sky_i),
-            'total_pixels': int(t_i),
-            'band_sky_ratio': round(band_ratio, 4),
-            'weight': round(w_i, 4),
-            'weighted_contribution': round(w_i * band_ratio, 4)
-        })
-        
-        total_weighted_sky += w_i * band_ratio
-        total_weight += w_i
+    # Sky pixels per band from one row count and its running sum, instead
+    # of slicing and summing the mask once per band
+    row_sky = np.count_nonzero(sky_mask, axis=1)
+    cum_sky = np.concatenate(([0], np.cumsum(row_sky, dtype=np.int64)))
+    sky_i = cum_sky[y_ends] - cum_sky[y_starts]  # Sky pixels
+    t_i = (y_ends - y_starts) * w                # Total pixels
+    
+    # Calculate band sky ratio
+    band_ratio = np.divide(sky_i, t_i, out=np.zeros(n_bands), where=t_i > 0)
+    
+    # Calculate weight: w_i = (n - i + 1) / n
+    # Top bands (i=1) have highest weight, bottom bands (i=n) have lowest
+    # This gives a linear decrease from top to bottom
+    weights = (n_bands - np.arange(n_bands)) / n_bands
+    contributions = weights * band_ratio
+    
+    # Summed band by band in order (n scalars), as the original loop did
+    total_weighted_sky = sum(contributions.tolist())
+    total_weight = sum(weights.tolist())
+    
+    band_results = []
+    if detail:
+        band_results = [
+            {
+                'band': i,
+                'y_start': y_start,
+                'y_end': y_end,
+                'sky_pixels': sky,
+                'total_pixels': total,
+                'band_sky_ratio': round(ratio, 4),
+                'weight': round(weight, 4),
+                'weighted_contribution': round(contribution, 4)
+            }
+            for i, y_start, y_end, sky, total, ratio, weight, contribution in zip(
+                range(1, n_bands + 1), y_starts.tolist(), y_ends.tolist(), sky_i.tolist(),
+                t_i.tolist(), band_ratio.tolist(), weights.tolist(), contributions.tolist())
+        ]
     
     # Calculate VF_sky (normalized)
     if total_weight > 0:
@@ -146,7 +189,7 @@ def calculate_sky_view_factor(sky_mask: np.ndarray, n_bands: int = 10) -> Dict:
         vf_sky = 0.0
     
     # Also calculate simple (unweighted) sky ratio for comparison
-    simple_sky_ratio = np.sum(sky_mask > 0) / sky_mask.size
+    simple_sky_ratio = cum_sky[-1] / sky_mask.size
     
     return {
         'vf_sky': vf_sky,
@@ -162,7 +205,7 @@ def calculate_sky_view_factor(sky_mask: np.ndarray, n_bands: int = 10) -> Dict:
 # =============================================================================
 def calculate_indicator(image_path: str, 
                         semantic_colors: Dict[str, Tuple[int, int, int]] = None,
-                        n_bands: int = 10) -> Dict:
+                        n_bands: int = 10, detail: bool = True) -> Dict:
     """
     Calculate the Shade Coverage (SHA) indicator based on sky visibility.
     
@@ -180,6 +223,7 @@ def calculate_indicator(image_path: str,
         image_path: Path to the semantic segmentation mask image
         semantic_colors: Dictionary mapping class names to RGB tuples.
         n_bands: Number of horizontal bands for VF calculation (default: 10)
+        detail: If False, skip the per-band 'band_results' list.
         
     Returns:
         dict: Result dictionary containing:
@@ -198,42 +242,45 @@ def calculate_indicator(image_path: str,
         ...     print(f"Sky View Factor: {result['vf_sky']:.3f}")
     """
     try:
-        # Step 1: Load and prepare the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
+        # Step 1: Load the decoded mask (read-only, shared with the other
+        # calculators working on the same image)
+        pixels = load_cached_pixels(image_path)
         h, w, _ = pixels.shape
         total_pixels = h * w
         
         # Step 2: Create sky mask
-        sky_mask = np.zeros((h, w), dtype=np.uint8)
         sky_classes_found = {}
         
         if semantic_colors:
-            # Use provided semantic color configuration
-            for class_name, rgb in semantic_colors.items():
-                # Check if this class is sky-related
-                class_lower = class_name.lower()
-                is_sky = any(sky_kw in class_lower for sky_kw in SKY_KEYWORDS)
-                
-                if is_sky:
-                    mask = np.all(pixels == rgb, axis=2)
-                    count = int(np.sum(mask))
-                    if count > 0:
-                        sky_mask[mask] = 1
-                        sky_classes_found[class_name] = count
+            # Use provided semantic color configuration: sky-related classes
+            sky_names = [class_name for class_name in semantic_colors
+                         if any(sky_kw in class_name.lower() for sky_kw in SKY_KEYWORDS)]
+            sky_keys = pack_rgb(np.array([semantic_colors[name] for name in sky_names],
+                                         dtype=np.uint8).reshape(-1, 3))
+            
+            # One pass over the packed pixels for all sky colors instead of
+            # a full-image comparison per class
+            packed = pack_rgb(pixels)
+            is_sky = np.isin(packed, sky_keys)
+            sky_mask = is_sky.view(np.uint8)
+            
+            # Per-class counts from the histogram of the sky pixels only
+            uniq_keys, key_counts = np.unique(packed[is_sky], return_counts=True)
+            sky_counts = lookup_counts(uniq_keys, key_counts, sky_keys).tolist()
+            for class_name, count in zip(sky_names, sky_counts):
+                if count > 0:
+                    sky_classes_found[class_name] = count
         else:
             # Try to detect sky by common colors (fallback)
             # Light blue colors often represent sky
             # This is a simple heuristic when no semantic config is provided
-            r, g, b = pixels[:,:,0], pixels[:,:,1], pixels[:,:,2]
-            # Sky typically: high blue, moderate-high overall brightness
-            sky_like = (b > 150) & (b > r) & (b > g) & ((r + g + b) > 300)
-            sky_mask[sky_like] = 1
-            if np.sum(sky_like) > 0:
-                sky_classes_found['detected_sky'] = int(np.sum(sky_like))
+            sky_mask = detect_sky_fallback(pixels)
+            sky_count = int(np.count_nonzero(sky_mask))
+            if sky_count > 0:
+                sky_classes_found['detected_sky'] = sky_count
         
         # Step 3: Calculate Sky View Factor
-        vf_result = calculate_sky_view_factor(sky_mask, n_bands)
+        vf_result = calculate_sky_view_factor(sky_mask, n_bands, detail)
         
         # Step 4: Calculate Shade Coverage
         # SHA = 1 - VF_sky
@@ -241,10 +288,10 @@ def calculate_indicator(image_path: str,
         simple_shade = 1.0 - vf_result['simple_sky_ratio']
         
         # Step 5: Calculate additional metrics
-        sky_pixels = int(np.sum(sky_mask > 0))
+        sky_pixels = int(np.count_nonzero(sky_mask))
         
         # Step 6: Return results
-        return {
+        result = {
             'success': True,
             'value': round(shade_coverage, 3),
             'vf_sky': round(vf_result['vf_sky'], 3),
@@ -256,9 +303,11 @@ def calculate_indicator(image_path: str,
             'sky_coverage_pct': round(vf_result['simple_sky_ratio'] * 100, 2),
             'shade_coverage_pct': round(simple_shade * 100, 2),
             'n_bands': n_bands,
-            'sky_classes_found': sky_classes_found,
-            'band_results': vf_result['band_results']
+            'sky_classes_found': sky_classes_found
         }
+        if detail:
+            result['band_results'] = vf_result['band_results']
+        return result
         
     except FileNotFoundError:
         return {
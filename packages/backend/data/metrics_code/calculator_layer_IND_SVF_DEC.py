@@ -13,10 +13,19 @@ Description:
 Formula: SVF_DEC = SVFS - SVFP
 """
 
+import logging
+import os
+from functools import lru_cache
+from operator import itemgetter
+
 import numpy as np
 from PIL import Image
 from typing import Dict, List, Tuple
 
+from _mask_cache import keyword_matcher, load_mask_keys, lookup_counts, map_images, pack_rgb
+
+logger = logging.getLogger(__name__)
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -54,9 +63,8 @@ INDICATOR = {
     "note": "Higher values indicate trees significantly reduce sky visibility"
 }
 
-print(f"\nCalculator ready: {INDICATOR['id']} - {INDICATOR['name']}")
-print(f" Formula: {INDICATOR['formula']}")
-print(f" Type: TYPE D (Derived Ratio)")
+logger.debug("Calculator ready: %s - %s (TYPE D, %s)",
+             INDICATOR['id'], INDICATOR['name'], INDICATOR['formula'])
 
 
 # =============================================================================
@@ -88,6 +96,11 @@ TREE_KEYWORDS = [
     "greenery", "flora"
 ]
 
+# Keyword predicates: one case-insensitive regex per group, cached per name
+SKY_MATCHER = keyword_matcher(SKY_KEYWORDS)
+BUILDING_MATCHER = keyword_matcher(BUILDING_KEYWORDS)
+TREE_MATCHER = keyword_matcher(TREE_KEYWORDS)
+
 
 def is_sky_class(class_name: str) -> bool:
     """
@@ -99,8 +112,7 @@ def is_sky_class(class_name: str) -> bool:
     Returns:
         bool: True if class is sky related
     """
-    class_lower = class_name.lower().replace("-", " ").replace("_", " ")
-    return any(kw in class_lower for kw in SKY_KEYWORDS)
+    return SKY_MATCHER(class_name)
 
 
 def is_building_class(class_name: str) -> bool:
@@ -113,8 +125,7 @@ def is_building_class(class_name: str) -> bool:
     Returns:
         bool: True if class is building related
     """
-    class_lower = class_name.lower().replace("-", " ").replace("_", " ")
-    return any(kw in class_lower for kw in BUILDING_KEYWORDS)
+    return BUILDING_MATCHER(class_name)
 
 
 def is_tree_class(class_name: str) -> bool:
@@ -127,15 +138,88 @@ def is_tree_class(class_name: str) -> bool:
     Returns:
         bool: True if class is tree/vegetation related
     """
-    class_lower = class_name.lower().replace("-", " ").replace("_", " ")
-    return any(kw in class_lower for kw in TREE_KEYWORDS)
+    return TREE_MATCHER(class_name)
+
+
+@lru_cache(maxsize=16)
+def classify_palette(colors: Tuple[Tuple[str, Tuple[int, int, int]], ...]) -> Dict:
+    """
+    Split a semantic palette into sky, building and tree classes (cached per palette).
+    
+    Args:
+        colors: (class_name, rgb) pairs of the palette
+        
+    Returns:
+        dict: For each of 'sky', 'building' and 'tree': '<group>_names'
+            (list of class names), '<group>_keys' (packed uint32 colors
+            aligned with the names) and '<group>_unique' (deduplicated keys)
+    """
+    groups = {'sky': ([], []), 'building': ([], []), 'tree': ([], [])}
+    for class_name, rgb in colors:
+        if is_sky_class(class_name):
+            group = 'sky'
+        elif is_building_class(class_name):
+            group = 'building'
+        elif is_tree_class(class_name):
+            group = 'tree'
+        else:
+            continue
+        groups[group][0].append(class_name)
+        groups[group][1].append(rgb)
+    
+    split = {}
+    for group, (names, rgbs) in groups.items():
+        keys = pack_rgb(np.array(rgbs, dtype=np.uint8).reshape(-1, 3))
+        split[f'{group}_names'] = names
+        split[f'{group}_keys'] = keys
+        split[f'{group}_unique'] = np.unique(keys)
+    
+    # Every key looked up per image, concatenated so that a single
+    # searchsorted serves all groups: per-class keys first, then the
+    # deduplicated keys, each in sky/building/tree order
+    parts = [split[f'{group}_{kind}'] for kind in ('keys', 'unique') for group in groups]
+    split['lookup_keys'] = np.concatenate(parts)
+    split['lookup_bounds'] = np.cumsum([part.size for part in parts])[:-1]
+    split['n_classes'] = sum(len(split[f'{group}_names']) for group in groups)
+    # Shared between calls: make sure nobody mutates the cached arrays
+    for value in split.values():
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+    return split
+
+
+def check_palette(semantic_colors: Dict[str, Tuple[int, int, int]] = None) -> Tuple[Dict, str]:
+    """
+    Resolve and validate the palette before any image is decoded.
+    
+    Without a palette, or with one that has no sky, building or tree
+    class, every mask would yield SVF_DEC = 0, which cannot be told
+    apart from a real tree-free image. The split is cached per palette,
+    so this check costs one cache lookup per image.
+    
+    Args:
+        semantic_colors: Dictionary mapping class names to RGB tuples.
+        
+    Returns:
+        tuple: (split, error) - the classify_palette() split and None,
+            or None and an error message
+    """
+    if not semantic_colors:
+        return None, 'semantic_colors required'
+    
+    split = classify_palette(
+        tuple((class_name, tuple(rgb)) for class_name, rgb in semantic_colors.items()))
+    if split['n_classes'] == 0:
+        return None, 'semantic_colors has no sky, building or tree classes'
+    return split, None
 
 
 # =============================================================================
 # CALCULATION FUNCTION
 # =============================================================================
 def calculate_indicator(image_path: str, 
-                        semantic_colors: Dict[str, Tuple[int, int, int]] = None) -> Dict:
+                        semantic_colors: Dict[str, Tuple[int, int, int]] = None,
+                        detail: bool = True) -> Dict:
     """
     Calculate the Sky View Factor Decrease (SVF_DEC) indicator.
     
@@ -151,6 +235,9 @@ def calculate_indicator(image_path: str,
     Args:
         image_path: Path to the semantic segmentation mask image
         semantic_colors: Dictionary mapping class names to RGB tuples.
+        detail: If False, skip the per-class dicts ('tree_classes_found',
+            'sky_classes_found', 'building_classes_found', 'n_tree_classes')
+            and only count the sky/building/tree totals.
         
     Returns:
         dict: Result dictionary containing:
@@ -169,103 +256,23 @@ def calculate_indicator(image_path: str,
         ...     print(f"SVF_DEC: {result['value']:.4f}")
         ...     print(f"SVFS: {result['svfs']:.4f}, SVFP: {result['svfp']:.4f}")
     """
-    try:
-        # Step 1: Load and prepare the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        
-        # Step 2: Create masks for sky, buildings, and trees
-        sky_mask = np.zeros((h, w), dtype=np.uint8)
-        building_mask = np.zeros((h, w), dtype=np.uint8)
-        tree_mask = np.zeros((h, w), dtype=np.uint8)
-        
-        sky_classes_found = {}
-        building_classes_found = {}
-        tree_classes_found = {}
-        
-        if semantic_colors:
-            # Use provided semantic color configuration
-            for class_name, rgb in semantic_colors.items():
-                mask = np.all(pixels == rgb, axis=2)
-                count = int(np.sum(mask))
-                
-                if count > 0:
-                    if is_sky_class(class_name):
-                        sky_mask[mask] = 1
-                        sky_classes_found[class_name] = count
-                    elif is_building_class(class_name):
-                        building_mask[mask] = 1
-                        building_classes_found[class_name] = count
-                    elif is_tree_class(class_name):
-                        tree_mask[mask] = 1
-                        tree_classes_found[class_name] = count
-        
-        # Step 3: Calculate pixel counts
-        sky_pixels = int(np.sum(sky_mask > 0))
-        building_pixels = int(np.sum(building_mask > 0))
-        tree_pixels = int(np.sum(tree_mask > 0))
-        
-        # Step 4: Calculate SVF values
-        # SVFS = Sky / (Sky + Building)  [Simulation - without trees]
-        # SVFP = Sky / (Sky + Building + Tree)  [Photographic - with trees]
-        
-        # Denominator for SVFS (simulation, no trees)
-        denom_svfs = sky_pixels + building_pixels
-        # Denominator for SVFP (photographic, with trees)
-        denom_svfp = sky_pixels + building_pixels + tree_pixels
-        
-        if denom_svfs > 0:
-            svfs = sky_pixels / denom_svfs
-        else:
-            svfs = 1.0  # If no buildings, full sky view
-        
-        if denom_svfp > 0:
-            svfp = sky_pixels / denom_svfp
-        else:
-            svfp = 1.0  # If nothing visible, assume full sky view
-        
-        # Step 5: Calculate SVF Decrease
-        # SVF_DEC = SVFS - SVFP
-        svf_dec = svfs - svfp
-        
-        # Ensure non-negative (should always be >= 0 mathematically)
-        svf_dec = max(0.0, svf_dec)
-        
-        # Step 6: Calculate additional metrics
-        sky_pct = (sky_pixels / total_pixels * 100) if total_pixels > 0 else 0
-        building_pct = (building_pixels / total_pixels * 100) if total_pixels > 0 else 0
-        tree_pct = (tree_pixels / total_pixels * 100) if total_pixels > 0 else 0
-        
-        # Percent of SVF lost due to trees
-        svf_decrease_pct = svf_dec * 100
-        # Relative decrease (percentage of original SVFS lost)
-        relative_decrease = (svf_dec / svfs * 100) if svfs > 0 else 0
-        
-        # Sort classes by pixel count
-        sorted_tree = dict(sorted(tree_classes_found.items(), key=lambda x: x[1], reverse=True))
-        
-        # Step 7: Return results
+    # Fail fast on a missing or unusable palette, before decoding the image
+    split, error = check_palette(semantic_colors)
+    if error:
         return {
-            'success': True,
-            'value': round(svf_dec, 4),
-            'svfs': round(svfs, 4),
-            'svfp': round(svfp, 4),
-            'sky_pixels': sky_pixels,
-            'building_pixels': building_pixels,
-            'tree_pixels': tree_pixels,
-            'total_pixels': int(total_pixels),
-            'sky_pct': round(sky_pct, 2),
-            'building_pct': round(building_pct, 2),
-            'tree_pct': round(tree_pct, 2),
-            'svf_decrease_pct': round(svf_decrease_pct, 2),
-            'relative_decrease_pct': round(relative_decrease, 2),
-            'n_tree_classes': len(tree_classes_found),
-            'tree_classes_found': sorted_tree,
-            'sky_classes_found': sky_classes_found,
-            'building_classes_found': building_classes_found
+            'success': False,
+            'error': error,
+            'value': None
         }
+    
+    try:
+        # Step 1: Load the packed-color histogram of the mask
+        # (decoded once per file and shared with other calculators)
+        uniq_keys, key_counts, total_pixels = load_mask_keys(image_path)
+        
+        # Steps 2-7: Classify the histogram and derive the SVF values
+        return calculate_from_histogram(uniq_keys, key_counts, total_pixels,
+                                        semantic_colors, detail)
         
     except FileNotFoundError:
         return {
@@ -281,6 +288,164 @@ def calculate_indicator(image_path: str,
         }
 
 
+def calculate_from_histogram(uniq_keys: np.ndarray, key_counts: np.ndarray,
+                             total_pixels: int,
+                             semantic_colors: Dict[str, Tuple[int, int, int]] = None,
+                             detail: bool = True) -> Dict:
+    """
+    Calculate SVF_DEC from a packed-color histogram instead of an image file.
+    
+    This is the array-level core of calculate_indicator(). Callers that
+    already hold a segmentation result (e.g. a GPU pipeline) can build the
+    histogram with _mask_cache.key_histogram() on the device and hand over
+    only the small (keys, counts) pair.
+    
+    Args:
+        uniq_keys: Sorted packed colors (R | G<<8 | B<<16) present in the mask
+        key_counts: Pixel counts aligned with uniq_keys
+        total_pixels: Total number of pixels in the mask
+        semantic_colors: Dictionary mapping class names to RGB tuples.
+        detail: See calculate_indicator()
+        
+    Returns:
+        dict: Same result dictionary as calculate_indicator()
+    """
+    split, error = check_palette(semantic_colors)
+    if error:
+        return {
+            'success': False,
+            'error': error,
+            'value': None
+        }
+    
+    # Step 2: Count sky, building and tree pixels per class
+    sky_classes_found = {}
+    building_classes_found = {}
+    tree_classes_found = {}
+    
+    if detail:
+        counts = np.split(lookup_counts(uniq_keys, key_counts, split['lookup_keys']),
+                          split['lookup_bounds'])
+        
+        found = {
+            'sky': sky_classes_found,
+            'building': building_classes_found,
+            'tree': tree_classes_found,
+        }
+        for (group, classes_found), class_counts in zip(found.items(), counts[:3]):
+            for class_name, count in zip(split[f'{group}_names'], class_counts.tolist()):
+                if count > 0:
+                    classes_found[class_name] = count
+        group_counts = counts[3:]
+    else:
+        group_counts = [lookup_counts(uniq_keys, key_counts, split[f'{group}_unique'])
+                        for group in ('sky', 'building', 'tree')]
+    
+    # Step 3: Calculate pixel counts
+    # Classes sharing a color are counted once, as with a per-pixel mask
+    sky_pixels, building_pixels, tree_pixels = (int(c.sum()) for c in group_counts)
+    
+    # Step 4: Calculate SVF values
+    # SVFS = Sky / (Sky + Building)  [Simulation - without trees]
+    # SVFP = Sky / (Sky + Building + Tree)  [Photographic - with trees]
+    
+    # Denominator for SVFS (simulation, no trees)
+    denom_svfs = sky_pixels + building_pixels
+    # Denominator for SVFP (photographic, with trees)
+    denom_svfp = sky_pixels + building_pixels + tree_pixels
+    
+    if denom_svfs > 0:
+        svfs = sky_pixels / denom_svfs
+    else:
+        svfs = 1.0  # If no buildings, full sky view
+    
+    if denom_svfp > 0:
+        svfp = sky_pixels / denom_svfp
+    else:
+        svfp = 1.0  # If nothing visible, assume full sky view
+    
+    # Step 5: Calculate SVF Decrease
+    # SVF_DEC = SVFS - SVFP
+    svf_dec = svfs - svfp
+    
+    # Ensure non-negative (should always be >= 0 mathematically)
+    svf_dec = max(0.0, svf_dec)
+    
+    # Step 6: Calculate additional metrics
+    sky_pct = (sky_pixels / total_pixels * 100) if total_pixels > 0 else 0
+    building_pct = (building_pixels / total_pixels * 100) if total_pixels > 0 else 0
+    tree_pct = (tree_pixels / total_pixels * 100) if total_pixels > 0 else 0
+    
+    # Percent of SVF lost due to trees
+    svf_decrease_pct = svf_dec * 100
+    # Relative decrease (percentage of original SVFS lost)
+    relative_decrease = (svf_dec / svfs * 100) if svfs > 0 else 0
+    
+    # Step 7: Return results
+    # Scalars are rounded one by one with round(): np.round scales by
+    # 10**n before rounding and can disagree in the last digit, and
+    # batching a dozen values into an array saves nothing measurable.
+    result = {
+        'success': True,
+        'value': round(svf_dec, 4),
+        'svfs': round(svfs, 4),
+        'svfp': round(svfp, 4),
+        'sky_pixels': sky_pixels,
+        'building_pixels': building_pixels,
+        'tree_pixels': tree_pixels,
+        'total_pixels': int(total_pixels),
+        'sky_pct': round(sky_pct, 2),
+        'building_pct': round(building_pct, 2),
+        'tree_pct': round(tree_pct, 2),
+        'svf_decrease_pct': round(svf_decrease_pct, 2),
+        'relative_decrease_pct': round(relative_decrease, 2)
+    }
+    if not detail:
+        return result
+    
+    # Sort classes by pixel count
+    sorted_tree = dict(sorted(tree_classes_found.items(), key=itemgetter(1), reverse=True))
+    
+    result.update({
+        'n_tree_classes': len(tree_classes_found),
+        'tree_classes_found': sorted_tree,
+        'sky_classes_found': sky_classes_found,
+        'building_classes_found': building_classes_found
+    })
+    return result
+
+
+# =============================================================================
+# BATCH CALCULATION
+# =============================================================================
+def calculate_indicator_batch(image_paths: List[str],
+                              semantic_colors: Dict[str, Tuple[int, int, int]] = None,
+                              n_workers: int = None,
+                              detail: bool = True) -> List[Dict]:
+    """
+    Calculate SVF_DEC for many masks on a thread pool (see _mask_cache.map_images()).
+    
+    The palette is checked and split once up front, before any image is
+    decoded.
+    
+    Args:
+        image_paths: Paths to semantic segmentation mask images
+        semantic_colors: Dictionary mapping class names to RGB tuples.
+        n_workers: Number of worker threads (default: os.cpu_count())
+        detail: Passed through to calculate_indicator()
+        
+    Returns:
+        list: One calculate_indicator() result dict per path, in order
+    """
+    # Validates and warms the palette split once for all workers
+    _, error = check_palette(semantic_colors)
+    if error:
+        return [{'success': False, 'error': error, 'value': None} for _ in image_paths]
+    
+    return map_images(lambda path: calculate_indicator(path, semantic_colors, detail),
+                      image_paths, n_workers)
+
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -13,10 +13,14 @@ Description:
 Formula: TSV = Area_tree / Area_sky
 """
 
+from operator import itemgetter
+
 import numpy as np
 from PIL import Image
 from typing import Dict, List, Tuple
 
+from _mask_cache import keyword_matcher, load_cached_pixels, load_mask_keys, lookup_counts, pack_rgb
+
 
 # =============================================================================
 # INDICATOR DEFINITION
@@ -76,6 +80,10 @@ SKY_KEYWORDS = [
     "cloud", "clouds"
 ]
 
+# Keyword predicates: one case-insensitive regex per group, cached per name
+TREE_MATCHER = keyword_matcher(TREE_KEYWORDS)
+SKY_MATCHER = keyword_matcher(SKY_KEYWORDS)
+
 
 def is_tree_class(class_name: str) -> bool:
     """
@@ -87,8 +95,7 @@ def is_tree_class(class_name: str) -> bool:
     Returns:
         bool: True if class is tree/vegetation related
     """
-    class_lower = class_name.lower().replace("-", " ").replace("_", " ")
-    return any(kw in class_lower for kw in TREE_KEYWORDS)
+    return TREE_MATCHER(class_name)
 
 
 def is_sky_class(class_name: str) -> bool:
@@ -101,8 +108,7 @@ def is_sky_class(class_name: str) -> bool:
     Returns:
         bool: True if class is sky related
     """
-    class_lower = class_name.lower().replace("-", " ").replace("_", " ")
-    return any(kw in class_lower for kw in SKY_KEYWORDS)
+    return SKY_MATCHER(class_name)
 
 
 # =============================================================================
@@ -145,63 +151,71 @@ def calculate_indicator(image_path: str,
         ...     print(f"Tree: {result['tree_pct']:.1f}%, Sky: {result['sky_pct']:.1f}%")
     """
     try:
-        # Step 1: Load and prepare the image
-        img = Image.open(image_path).convert('RGB')
-        pixels = np.array(img)
-        h, w, _ = pixels.shape
-        total_pixels = h * w
-        
-        # Step 2: Create masks for tree and sky
-        tree_mask = np.zeros((h, w), dtype=np.uint8)
-        sky_mask = np.zeros((h, w), dtype=np.uint8)
+        # Step 1: Count tree and sky pixels
+        # Only the counts are needed, so no per-group masks are allocated;
+        # classes sharing a color are counted once per group.
+        tree_pixels = 0
+        sky_pixels = 0
+        tree_keys = set()
+        sky_keys = set()
         tree_classes_found = {}
         sky_classes_found = {}
         
         if semantic_colors:
-            # Use provided semantic color configuration
-            for class_name, rgb in semantic_colors.items():
-                mask = np.all(pixels == rgb, axis=2)
-                count = int(np.sum(mask))
-                
+            # Use provided semantic color configuration: look every class up
+            # in the cached packed-color histogram of the mask instead of
+            # comparing the full image once per class
+            uniq_keys, key_counts, total_pixels = load_mask_keys(image_path)
+            class_keys = pack_rgb(np.array(list(semantic_colors.values()),
+                                           dtype=np.uint8).reshape(-1, 3))
+            class_counts = lookup_counts(uniq_keys, key_counts, class_keys)
+            
+            for class_name, key, count in zip(semantic_colors, class_keys.tolist(),
+                                              class_counts.tolist()):
                 if count > 0:
                     if is_tree_class(class_name):
-                        tree_mask[mask] = 1
+                        if key not in tree_keys:
+                            tree_keys.add(key)
+                            tree_pixels += count
                         tree_classes_found[class_name] = count
                     elif is_sky_class(class_name):
-                        sky_mask[mask] = 1
+                        if key not in sky_keys:
+                            sky_keys.add(key)
+                            sky_pixels += count
                         sky_classes_found[class_name] = count
         else:
             # Fallback: try to detect by common colors (heuristic)
+            # (decoded once per file and shared with other calculators;
+            # the array is read-only)
+            pixels = load_cached_pixels(image_path)
+            h, w, _ = pixels.shape
+            total_pixels = h * w
             r, g, b = pixels[:,:,0], pixels[:,:,1], pixels[:,:,2]
             
             # Green-ish colors for vegetation
             green_like = (g > r) & (g > b) & (g > 50)
-            tree_mask[green_like] = 1
-            if np.sum(green_like) > 0:
-                tree_classes_found['detected_vegetation'] = int(np.sum(green_like))
+            tree_pixels = int(np.count_nonzero(green_like))
+            if tree_pixels > 0:
+                tree_classes_found['detected_vegetation'] = tree_pixels
             
             # Blue-ish colors for sky
             sky_like = (b > 150) & (b > r) & ((r + g + b) > 300)
-            sky_mask[sky_like] = 1
-            if np.sum(sky_like) > 0:
-                sky_classes_found['detected_sky'] = int(np.sum(sky_like))
-        
-        # Step 3: Calculate pixel counts
-        tree_pixels = int(np.sum(tree_mask > 0))
-        sky_pixels = int(np.sum(sky_mask > 0))
+            sky_pixels = int(np.count_nonzero(sky_like))
+            if sky_pixels > 0:
+                sky_classes_found['detected_sky'] = sky_pixels
         
-        # Step 4: Calculate TSV ratio
+        # Step 2: Calculate TSV ratio
         if sky_pixels > 0:
             tsv = tree_pixels / sky_pixels
         else:
             # No sky visible - return max_value if trees exist, else 0
             tsv = max_value if tree_pixels > 0 else 0.0
         
-        # Step 5: Calculate percentages
+        # Step 3: Calculate percentages
         tree_pct = (tree_pixels / total_pixels) * 100 if total_pixels > 0 else 0
         sky_pct = (sky_pixels / total_pixels) * 100 if total_pixels > 0 else 0
         
-        # Step 6: Return results
+        # Step 4: Return results
         return {
             'success': True,
             'value': round(tsv, 3),
@@ -212,8 +226,8 @@ def calculate_indicator(image_path: str,
             'sky_pct': round(sky_pct, 2),
             'n_tree_classes': len(tree_classes_found),
             'n_sky_classes': len(sky_classes_found),
-            'tree_classes_found': dict(sorted(tree_classes_found.items(), key=lambda x: x[1], reverse=True)),
-            'sky_classes_found': dict(sorted(sky_classes_found.items(), key=lambda x: x[1], reverse=True)),
+            'tree_classes_found': dict(sorted(tree_classes_found.items(), key=itemgetter(1), reverse=True)),
+            'sky_classes_found': dict(sorted(sky_classes_found.items(), key=itemgetter(1), reverse=True)),
             'sky_is_zero': sky_pixels == 0
         }
         
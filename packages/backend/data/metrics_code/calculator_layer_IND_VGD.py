@@ -413,9 +413,7 @@ if __name__ == "__main__":
     test_img_3 = np.zeros((100, 100, 3), dtype=np.uint8)
     test_img_3[:, :] = [135, 206, 235]  # Sky blue (background)
     # Create scattered pattern - every 5th pixel in a grid
-    for i in range(0, 100, 5):
-        for j in range(0, 100, 5):
-            test_img_3[i, j] = [34, 139, 34]  # Scattered green pixels
+    test_img_3[::5, ::5] = [34, 139, 34]  # Scattered green pixels
     
     test_path_3 = '/tmp/test_vgd_3.png'
     Image.fromarray(test_img_3).save(test_path_3)